@@ -0,0 +1,92 @@
+from __future__ import annotations
+import collections
+import math
+import re
+import threading
+
+_WORD = re.compile(r"\w+")
+
+
+def tokenise(text: str) -> list[str]:
+    """ Splits text into lower case words """
+    return _WORD.findall(text.lower())
+
+
+class ArticleIndex:
+    """ In-memory inverted index over article text, ranked with BM25.
+        Articles can be added and removed one at a time, so the index
+        is kept up to date as news updates come in.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75) -> None:
+        self.k1 = k1
+        self.b = b
+        # term -> {key: number of times the term appears}
+        self._postings = collections.defaultdict(dict)
+        self._terms = {}
+        self._lengths = {}
+        self._total_length = 0
+        # News updates add articles from the scheduler thread while
+        # searches run on request threads
+        self._lock = threading.Lock()
+
+    def add(self, key: object, text: str) -> None:
+        """ Indexes a text under 'key', replacing any text already there """
+        terms = collections.Counter(tokenise(text))
+        with self._lock:
+            self._remove(key)
+            for term, count in terms.items():
+                self._postings[term][key] = count
+            length = sum(terms.values())
+            self._terms[key] = tuple(terms)
+            self._lengths[key] = length
+            self._total_length += length
+
+    def remove(self, key: object) -> None:
+        """ Removes the text indexed under 'key', if any """
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key: object) -> None:
+        length = self._lengths.pop(key, None)
+        if length is None:
+            return
+        self._total_length -= length
+        for term in self._terms.pop(key):
+            postings = self._postings[term]
+            del postings[key]
+            if not postings:
+                del self._postings[term]
+
+    def search(self, query: str, limit: int = None) -> list[tuple]:
+        """ Ranks indexed texts against a query with BM25.
+
+        :param query: Space separated search words
+        :type query: str
+        :param limit: Most results to return, or all matches if None
+        :type limit: int
+        :return: Returns (key, score) tuples, best match first
+        :rtype: list[tuple]
+        """
+        scores = collections.defaultdict(float)
+        with self._lock:
+            documents = len(self._lengths)
+            if not documents:
+                return []
+            average_length = self._total_length / documents or 1
+            for term in set(tokenise(query)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (documents - len(postings) + 0.5) / (
+                    len(postings) + 0.5))
+                for key, count in postings.items():
+                    norm = 1 - self.b + \
+                        self.b * self._lengths[key] / average_length
+                    scores[key] += idf * count * (self.k1 + 1) / (
+                        count + self.k1 * norm)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return ranked if limit is None else ranked[:limit]
+
+    def __len__(self) -> int:
+        return len(self._lengths)
@@ -0,0 +1,209 @@
+from __future__ import annotations
+import collections
+import datetime
+import hashlib
+import itertools
+import threading
+import time
+
+
+def _published_at(article: dict) -> float | None:
+    """ Returns an article's 'publishedAt' time as a timestamp, or None
+        if it is missing or can't be read.
+    """
+    published = article.get('publishedAt')
+    if not published:
+        return None
+    try:
+        return datetime.datetime.fromisoformat(
+            published.replace('Z', '+00:00')).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+class ArticleStore:
+    """ Ordered collection of news articles indexed by title and URL.
+        Articles keep the order they were added in, so slicing the
+        store gives the same articles the old 'news_articles' list did,
+        while checking for, adding or removing an article is O(1).
+        'evict' keeps the store within 'max_count' articles, dropping the
+        least recently used first, and drops articles published more
+        than 'max_age' seconds ago.
+    """
+
+    def __init__(self, max_count: int = None, max_age: float = None) -> None:
+        self.max_count = max_count
+        self.max_age = max_age
+        self._articles = collections.OrderedDict()
+        self._urls = {}
+        # Titles from least to most recently used
+        self._recent = collections.OrderedDict()
+        # News updates add and evict on the scheduler thread while
+        # request threads read and touch articles. Reentrant because
+        # evict removes through remove.
+        self._lock = threading.RLock()
+
+    def add(self, article: dict) -> bool:
+        """ Adds an article unless one with the same title or URL
+            is already held.
+
+        :param article: Article dictionary with at least a 'title'
+        :type article: dict
+        :return: Returns True if the article was added
+        :rtype: bool
+        """
+        title = article['title']
+        url = article.get('url')
+        with self._lock:
+            if title in self._articles or (url and url in self._urls):
+                return False
+            self._articles[title] = article
+            self._recent[title] = None
+            if url:
+                self._urls[url] = title
+        return True
+
+    def touch(self, title: str) -> None:
+        """ Marks an article as used, e.g. because it was shown, so it is
+            evicted after articles that haven't been used since.
+        """
+        with self._lock:
+            if title in self._recent:
+                self._recent.move_to_end(title)
+
+    def evict(self, now: float = None) -> list[dict]:
+        """ Removes articles older than 'max_age' and then the least
+            recently used articles until at most 'max_count' are held.
+
+        :param now: Current time as a timestamp, defaults to time.time()
+        :type now: float
+        :return: Returns the removed articles
+        :rtype: list[dict]
+        """
+        evicted = []
+        with self._lock:
+            if self.max_age is not None:
+                oldest = (time.time() if now is None else now) - self.max_age
+                for title, article in list(self._articles.items()):
+                    published = _published_at(article)
+                    if published is not None and published < oldest:
+                        evicted.append(self.remove(title))
+            if self.max_count is not None:
+                while len(self._articles) > self.max_count:
+                    evicted.append(self.remove(next(iter(self._recent))))
+        return evicted
+
+    def remove(self, title: str) -> dict | None:
+        """ Removes the article with the given title.
+
+        :param title: Title of the article to remove
+        :type title: str
+        :return: Returns the removed article, or None if it wasn't held
+        :rtype: dict or None
+        """
+        with self._lock:
+            article = self._articles.pop(title, None)
+            self._recent.pop(title, None)
+            if article is not None and article.get('url'):
+                self._urls.pop(article['url'], None)
+        return article
+
+    def get(self, title: str) -> dict | None:
+        """ Returns the article with the given title, or None """
+        return self._articles.get(title)
+
+    def has_url(self, url: str) -> bool:
+        """ Checks whether an article with the given URL is held """
+        return url in self._urls
+
+    def clear(self) -> None:
+        """ Removes every article """
+        with self._lock:
+            self._articles.clear()
+            self._urls.clear()
+            self._recent.clear()
+
+    def __contains__(self, title: str) -> bool:
+        return title in self._articles
+
+    def __iter__(self):
+        # Iterates over a copy, so the store can change while the
+        # caller loops
+        with self._lock:
+            return iter(list(self._articles.values()))
+
+    def __len__(self) -> int:
+        return len(self._articles)
+
+    def __getitem__(self, index: int | slice) -> dict | list[dict]:
+        with self._lock:
+            if isinstance(index, slice):
+                start, stop, step = index.start, index.stop, index.step
+                if (start or 0) >= 0 and (stop is None or stop >= 0) and \
+                        (step or 1) > 0:
+                    # Only walk as far as the end of the slice
+                    return list(itertools.islice(
+                        self._articles.values(), start, stop, step))
+                return list(self._articles.values())[index]
+            if index < 0:
+                index += len(self._articles)
+            if not 0 <= index < len(self._articles):
+                raise IndexError("article index out of range")
+            return next(
+                itertools.islice(self._articles.values(), index, None))
+
+    def __repr__(self) -> str:
+        with self._lock:
+            return f"ArticleStore({list(self._articles)!r})"
+
+
+
+class TitleBlacklist:
+    """ Set of dismissed article titles that doesn't grow without limit.
+        Titles are kept as 8 byte hashes rather than full strings, and
+        are forgotten once they are older than 'max_age' seconds or when
+        more than 'max_count' are held, oldest first.
+    """
+
+    def __init__(
+            self, max_count: int = None, max_age: float = None) -> None:
+        self.max_count = max_count
+        self.max_age = max_age
+        # Title hash -> time it was added, oldest first
+        self._added = collections.OrderedDict()
+        # News updates prune on the scheduler thread while dismissed
+        # articles are added on request threads
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _hash(title: str) -> int:
+        return int.from_bytes(
+            hashlib.blake2b(title.encode(), digest_size=8).digest(), "big")
+
+    def add(self, title: str, now: float = None) -> None:
+        """ Blacklists a title """
+        key = self._hash(title)
+        with self._lock:
+            self._added.pop(key, None)
+            self._added[key] = time.time() if now is None else now
+            self._prune(now)
+
+    def prune(self, now: float = None) -> None:
+        """ Forgets titles past 'max_age' or beyond 'max_count' """
+        with self._lock:
+            self._prune(now)
+
+    def _prune(self, now: float = None) -> None:
+        if self.max_age is not None:
+            oldest = (time.time() if now is None else now) - self.max_age
+            while self._added and next(iter(self._added.values())) < oldest:
+                self._added.popitem(last=False)
+        if self.max_count is not None:
+            while len(self._added) > self.max_count:
+                self._added.popitem(last=False)
+
+    def __contains__(self, title: str) -> bool:
+        return self._hash(title) in self._added
+
+    def __len__(self) -> int:
+        return len(self._added)
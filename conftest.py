@@ -0,0 +1,5 @@
+import os
+
+# Importing main in the tests mustn't start the real update scheduler
+# or replay the real update journal
+os.environ['DASHBOARD_SKIP_STARTUP'] = '1'
@@ -0,0 +1,127 @@
+from __future__ import annotations
+import itertools
+import logging
+import operator
+from covid_series import CovidSeries
+
+
+def complete_days(
+        series: CovidSeries,
+        metric: str = "newCasesBySpecimenDate") -> list[int]:
+    """ Returns the daily values of a metric, newest first, starting
+        from the day after the latest reported one. The latest
+        specimen day is always incomplete, so it is skipped in the
+        same way as the 7-day sum in
+        'covid_data_handler.compute_covid_metrics'. Blank days count
+        as 0.
+
+    :param series: Series to read the metric from
+    :type series: CovidSeries
+    :param metric: Name of the metric column
+    :type metric: str
+    :return: Returns a list of daily values
+    :rtype: list[int]
+    """
+    latest = series.present[metric].find(1)
+    if latest == -1:
+        return []
+    return series.values[metric][latest + 1:].tolist()
+
+
+def prefix_sums(values: list[int]) -> list[int]:
+    """ Returns running totals of 'values' with a leading 0, so the
+        sum of values[i:j] is prefix[j] - prefix[i].
+    """
+    return list(itertools.accumulate(values, initial=0))
+
+
+def rolling_sums(
+        series: CovidSeries, window: int = 7,
+        metric: str = "newCasesBySpecimenDate",
+        prefix: list[int] = None) -> list[int]:
+    """ Sums a metric over every 'window' day stretch of complete
+        days, newest first. The first entry matches the dashboard's
+        7-day infection figure when 'window' is 7.
+
+    :param series: Series to read the metric from
+    :type series: CovidSeries
+    :param window: Number of days in each sum
+    :type window: int
+    :param metric: Name of the metric column
+    :type metric: str
+    :param prefix: Running totals from 'prefix_sums' to reuse
+    :type prefix: list[int]
+    :return: Returns a list of window sums
+    :rtype: list[int]
+    """
+    if window < 1:
+        raise ValueError("window must be at least 1 day")
+    if prefix is None:
+        prefix = prefix_sums(complete_days(series, metric))
+    return list(map(operator.sub, prefix[window:], prefix[:-window]))
+
+
+def rolling_means(
+        series: CovidSeries, window: int = 7,
+        metric: str = "newCasesBySpecimenDate",
+        prefix: list[int] = None) -> list[float]:
+    """ Averages a metric over every 'window' day stretch of
+        complete days, newest first.
+    """
+    sums = rolling_sums(series, window, metric, prefix)
+    return list(map(operator.truediv, sums, itertools.repeat(window)))
+
+
+def growth_percentage(current: int, previous: int) -> float | None:
+    """ Returns the change from 'previous' to 'current' as a
+        percentage, or None when there is nothing to compare with.
+    """
+    if not previous:
+        return None
+    return (current - previous) / previous * 100
+
+
+def rate_per_100k(value: int, population: int) -> float | None:
+    """ Scales a count to a rate per 100,000 people """
+    if not population:
+        return None
+    return value / population * 100_000
+
+
+def covid_trends(
+        series: CovidSeries, window: int = 7, population: int = None,
+        metric: str = "newCasesBySpecimenDate") -> dict:
+    """ Works out the latest rolling sum and mean, the change on the
+        previous window (week-over-week when 'window' is 7) and an
+        optional rate per 100k, all from one set of running totals.
+
+    :param series: Series to read the metric from
+    :type series: CovidSeries
+    :param window: Number of days in each window
+    :type window: int
+    :param population: Population of the area, for the per 100k rate
+    :type population: int
+    :param metric: Name of the metric column
+    :type metric: str
+    :return: Returns a dictionary with 'rolling_sum', 'rolling_mean',
+        'growth' and 'rate_per_100k' keys. Figures that cannot be
+        worked out from the data available are None.
+    :rtype: dict
+    """
+    logging.debug("Entered covid_trends")
+    prefix = prefix_sums(complete_days(series, metric))
+    sums = rolling_sums(series, window, metric, prefix)
+    trends = {
+        'rolling_sum': None,
+        'rolling_mean': None,
+        'growth': None,
+        'rate_per_100k': None,
+    }
+    if sums:
+        trends['rolling_sum'] = sums[0]
+        trends['rolling_mean'] = sums[0] / window
+        trends['rate_per_100k'] = rate_per_100k(sums[0], population)
+    if len(sums) > window:
+        trends['growth'] = growth_percentage(sums[0], sums[window])
+    logging.debug("Return value is: %s", trends)
+    return trends
@@ -0,0 +1,168 @@
+from __future__ import annotations
+import datetime
+import logging
+import mmap
+import os
+import re
+
+# Snapshot files are saved as <area type>_<YYYY-MM-DD>.csv,
+# e.g. nation_2021-10-28.csv
+SNAPSHOT_PATTERN = re.compile(
+    r"^(?P<area_type>[A-Za-z]+)_(?P<date>\d{4}-\d{2}-\d{2})\.csv$")
+
+
+class _Snapshot:
+    """ One memory-mapped snapshot file and its row-offset index """
+
+    __slots__ = ("path", "file", "map", "columns", "offsets")
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.file = open(path, "rb")
+        self.map = None
+        self.columns = {}
+        self.offsets = {}
+        # An empty file can't be mapped, and holds no rows anyway
+        if os.fstat(self.file.fileno()).st_size == 0:
+            logging.warning("Covid archive file is empty: %s", path)
+            return
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._build_index()
+        except KeyError:
+            logging.warning(
+                "Covid archive file has no areaName or date column: %s",
+                path)
+            self.offsets = {}
+
+    def _build_index(self) -> None:
+        """ Scans the mapped file once, recording the byte offset of
+            each row keyed by (areaName, date).
+        """
+        data = self.map
+        end = data.find(b"\n")
+        if end == -1:
+            end = len(data)
+        header = data[:end].decode("utf-8").strip().split(",")
+        self.columns = {name: index for index, name in enumerate(header)}
+        name_column = self.columns["areaName"]
+        date_column = self.columns["date"]
+        # Only the columns up to areaName and date need to be split
+        splits = max(name_column, date_column) + 1
+
+        pos = end + 1
+        size = len(data)
+        while pos < size:
+            end = data.find(b"\n", pos)
+            if end == -1:
+                end = size
+            fields = data[pos:end].split(b",", splits)
+            if len(fields) > splits - 1:
+                self.offsets[(
+                    fields[name_column].decode("utf-8"),
+                    fields[date_column].decode("utf-8")
+                )] = pos
+            pos = end + 1
+
+    def row(self, offset: int) -> list[str]:
+        """ Reads and splits the single row starting at 'offset' """
+        end = self.map.find(b"\n", offset)
+        if end == -1:
+            end = len(self.map)
+        return self.map[offset:end].decode("utf-8").strip().split(",")
+
+    def close(self) -> None:
+        if self.map is not None:
+            self.map.close()
+        self.file.close()
+
+
+class CovidArchive:
+    """ Random access over a directory of daily CSV snapshots such as
+        'nation_2021-10-28.csv'. Files are memory-mapped and indexed
+        the first time they are queried, after which looking up a
+        metric only reads the one row it lives in.
+    """
+
+    def __init__(self, directory: str = ".") -> None:
+        self.directory = directory
+        self._paths = {}
+        self._snapshots = {}
+        self.refresh()
+
+    def refresh(self) -> None:
+        """ Rescans the directory for snapshot files """
+        paths = {}
+        for filename in os.listdir(self.directory):
+            match = SNAPSHOT_PATTERN.match(filename)
+            if match:
+                snapshot_date = datetime.date.fromisoformat(
+                    match.group("date"))
+                paths.setdefault(snapshot_date, []).append(
+                    os.path.join(self.directory, filename))
+        self._paths = {
+            snapshot_date: sorted(files)
+            for snapshot_date, files in sorted(paths.items())
+        }
+        logging.debug(
+            "Covid archive has %s snapshot dates", len(self._paths))
+
+    def snapshot_dates(self) -> list[datetime.date]:
+        """ Returns the dates of every snapshot, oldest first """
+        return list(self._paths)
+
+    def _snapshot(self, path: str) -> _Snapshot:
+        snapshot = self._snapshots.get(path)
+        if snapshot is None:
+            logging.debug("Indexing covid archive file: %s", path)
+            snapshot = _Snapshot(path)
+            self._snapshots[path] = snapshot
+        return snapshot
+
+    def get(
+            self, metric: str, area: str, date: str | datetime.date,
+            snapshot_date: str | datetime.date = None) -> int | None:
+        """ Looks up one metric for an area on a given day.
+
+        :param metric: Column name, e.g. 'hospitalCases'
+        :type metric: str
+        :param area: Area name, e.g. 'England'
+        :type area: str
+        :param date: Day the figure is for
+        :type date: str or datetime.date
+        :param snapshot_date: Snapshot to read from. The latest snapshot
+            that holds the area and day is used if not given.
+        :type snapshot_date: str or datetime.date
+        :raises KeyError: If no snapshot holds the area, day or metric
+        :return: Returns the figure, or None if it was left blank
+        :rtype: int or None
+        """
+        date = str(date)
+        if snapshot_date is None:
+            dates = reversed(self._paths)
+        else:
+            if isinstance(snapshot_date, str):
+                snapshot_date = datetime.date.fromisoformat(snapshot_date)
+            dates = [snapshot_date]
+
+        for snapshot_date in dates:
+            for path in self._paths.get(snapshot_date, []):
+                snapshot = self._snapshot(path)
+                offset = snapshot.offsets.get((area, date))
+                if offset is None:
+                    continue
+                value = snapshot.row(offset)[snapshot.columns[metric]]
+                return int(value) if value else None
+        raise KeyError((metric, area, date))
+
+    def close(self) -> None:
+        """ Unmaps and closes every opened snapshot file """
+        for snapshot in self._snapshots.values():
+            snapshot.close()
+        self._snapshots = {}
+
+    def __enter__(self) -> CovidArchive:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
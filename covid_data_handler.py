@@ -1,20 +1,127 @@
 from __future__ import annotations
+import collections
+import concurrent.futures
+import itertools
 import logging
 import sched
+import threading
 import time
 import uk_covid19
 import load_config
-
+import covid_analytics
+import covid_store
+import data_version
+import update_jobs
+from covid_series import CovidSeries, iter_csv_rows
+
+# Only ever run by the update_scheduler thread, so covid updates never
+# overlap and, with same-minute updates sharing a run, each due time
+# fetches from the API once
 s = sched.scheduler(time.time, time.sleep)
 
+# Seconds all areas together are given to answer before the update
+# carries on without the ones that haven't
+COVID_FETCH_TIMEOUT = 30
+# Threads fetching areas from the API. The pool lives as long as the
+# app, so a request that never returns ('uk_covid19' sets no socket
+# timeout) ties up one of these threads rather than a new one each update
+COVID_FETCH_WORKERS = 4
+_fetch_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=COVID_FETCH_WORKERS, thread_name_prefix="covid-fetch")
+
+# Seconds a cached API response is served without asking the API whether
+# it has changed, and the most responses kept before the least recently
+# used one is dropped
+COVID_CACHE_TTL = 300
+COVID_CACHE_SIZE = 32
+
+_response_cache = collections.OrderedDict()
+_cache_lock = threading.Lock()
+cache_stats = {'hits': 0, 'misses': 0, 'revalidated': 0}
+
+# Series revision that each area's stats were last worked out from, so
+# unchanged series are not processed again
+_computed_revisions = {}
+
+# Stats worked out for the configured local area and for the nation
+LOCAL_STATS = ('local_7day_infections', 'local_7day_growth')
+NATION_STATS = ('deaths_total', 'hospital_cases',
+                'national_7day_infections', 'national_7day_growth')
+# (location, location_type) each stat in covid_stats was worked out for
+_stat_areas = {}
+
 covid_stats = {
     'deaths_total': "Total national deaths: ?",
     'hospital_cases': "National hospital cases: ?",
     'local_7day_infections': "?",
     'national_7day_infections': "?",
+    'local_7day_growth': "?",
+    'national_7day_growth': "?",
 }
 
 
+def load_saved_covid_state() -> None:
+    """ Restores the series and stats saved by the last successful
+        update, so the dashboard shows real figures straight after a
+        restart. The restored series count as expired, so the first
+        update checks them with the API and only fetches what changed.
+        Saved stats for an area that is no longer configured are left
+        out, so the dashboard never shows another area's figures.
+
+   :return: Doesn't return anything
+   :rtype: None
+    """
+    logging.debug("Entered load_saved_covid_state")
+    entries, stats = covid_store.load_covid_state()
+    config = load_config.get_config()
+    local_area = (config.covid_minor, config.covid_minor_id)
+    nation_area = (config.covid_major, config.covid_major_id)
+    expired = time.monotonic() - COVID_CACHE_TTL
+    with _cache_lock:
+        for cache_key, (series, last_update) in entries.items():
+            _response_cache[cache_key] = {
+                'series': series,
+                'last_update': last_update,
+                'fetched_at': expired,
+            }
+    for name, (area, value) in stats.items():
+        expected = local_area if name in LOCAL_STATS else nation_area
+        if name not in LOCAL_STATS + NATION_STATS or area != expected:
+            logging.debug("Not restoring %s saved for %s", name, area)
+            continue
+        covid_stats[name] = value
+        _stat_areas[name] = area
+
+
+def save_covid_state() -> None:
+    """ Saves the cached series and current stats to disk
+
+   :return: Doesn't return anything
+   :rtype: None
+    """
+    logging.debug("Entered save_covid_state")
+    with _cache_lock:
+        entries = dict(_response_cache)
+    covid_store.save_covid_state(entries, {
+        name: (area, covid_stats[name]) for name, area in _stat_areas.items()
+    })
+
+
+def stream_csv_data(csv_filename: str):
+    """ Lazily read a CSV file one stripped line at a time, so that
+        large files can be processed without loading them into memory.
+
+   :param csv_filename: Filename of CSV file to be read
+   :type csv_filename: str
+   :return: Yields the lines of the CSV file as strings
+   :rtype: generator
+    """
+    logging.debug("Entered stream_csv_data")
+    with open(csv_filename, "r", encoding="utf-8") as file:
+        for line in file:
+            yield line.strip()
+
+
 def parse_csv_data(csv_filename: str) -> list[str]:
     """ Take in CSV format data and process rows into a list
 
@@ -24,52 +131,80 @@ def parse_csv_data(csv_filename: str) -> list[str]:
    :rtype: list
     """
     logging.debug("Entered parse_csv_data")
-    csv_data_lines = []
-    with open(csv_filename, "r", encoding="utf-8") as file:
-        for line in file:
-            line = line.strip()
-            csv_data_lines.append(line)
-    logging.debug("Return value is: %s", csv_data_lines)
+    csv_data_lines = list(stream_csv_data(csv_filename))
+    logging.debug("Return value is: %s lines", len(csv_data_lines))
     return csv_data_lines
 
 
-def process_covid_csv_data(covid_csv_data: list) -> tuple[int, int, int]:
-    """Take in CSV list data from parse_csv_data and processes it
-        into a tuple of ints.
+def compute_covid_metrics(rows) -> tuple[int, int, int]:
+    """ Works out total_deaths, current_hospital_cases and
+        last7days_cases from newest-first rows in a single scan.
+        Each row is a (cumDailyNsoDeathsByDeathDate, hospitalCases,
+        newCasesBySpecimenDate) triple where missing values are ""
+        or None. The scan stops as soon as all three figures are
+        known, so only the first few rows are ever looked at.
+        The 7-day sum skips the latest reported specimen day as it
+        is incomplete, by adding the day after each reported one.
 
-   :param covid_csv_data: Filename of CSV file to be parsed into a list
-   :type covid_csv_data: str
-   :return: Returns a tuple of int types
+   :param rows: Iterable of (deaths, hospital cases, new cases) triples
+        ordered newest first
+   :type rows: iterable
+   :return: Returns a tuple of statical figures
    :rtype: tuple[int, int, int]
     """
 
-    logging.debug("Entered process_covid_csv_data")
-    csv_data_values = []
-    total_deaths = 0
-    current_hospital_cases = 0
+    logging.debug("Entered compute_covid_metrics")
+    missing = ("", None)
+    total_deaths = None
+    current_hospital_cases = None
     last7days_cases = 0
-
-    for line in covid_csv_data[1:]:
-        csv_data_values = line.split(",")
-        if csv_data_values[4] != "":
-            total_deaths = int(csv_data_values[4])
+    cnt = 0
+    # Set when the next row's cases belong in the 7-day sum
+    pending = False
+
+    for deaths, hospital_cases, new_cases in rows:
+        if pending:
+            last7days_cases += int(new_cases)
+            pending = False
+        if total_deaths is None and deaths not in missing:
+            total_deaths = int(deaths)
+        if current_hospital_cases is None and hospital_cases not in missing:
+            current_hospital_cases = int(hospital_cases)
+        if cnt < 7 and new_cases not in missing:
+            pending = True
+            cnt += 1
+        if cnt == 7 and not pending and total_deaths is not None \
+                and current_hospital_cases is not None:
             break
 
-    for line in covid_csv_data[1:]:
-        csv_data_values = line.split(",")
-        if csv_data_values[5] != "":
-            current_hospital_cases = int(csv_data_values[5])
-            break
+    if pending:
+        raise IndexError("No day found after the last reported case count")
 
-    cnt = 0
-    for index, line in enumerate(covid_csv_data[1:]):
-        csv_data_values = line.split(",")
-        if cnt == 7:
-            break
-        if csv_data_values[6] != "":
-            csv_data_values = covid_csv_data[index+2].split(",")
-            last7days_cases += int(csv_data_values[6])
-            cnt += 1
+    return (
+        total_deaths or 0,
+        current_hospital_cases or 0,
+        last7days_cases
+    )
+
+
+def process_covid_csv_data(covid_csv_data) -> tuple[int, int, int]:
+    """Take in CSV data and processes it into a tuple of ints.
+        Lines are read lazily and only until all three figures are
+        found, so a generator from stream_csv_data or a whole
+        get_csv() payload can be passed in without being loaded
+        into memory first.
+
+   :param covid_csv_data: Lines of CSV data including the header, such
+        as the list from parse_csv_data, or a CSV payload string
+   :type covid_csv_data: iterable or str
+   :return: Returns a tuple of int types
+   :rtype: tuple[int, int, int]
+    """
+
+    logging.debug("Entered process_covid_csv_data")
+    rows = (row[4:7] for row in iter_csv_rows(covid_csv_data))
+    total_deaths, current_hospital_cases, last7days_cases = \
+        compute_covid_metrics(rows)
 
     logging.debug(
         "Return value is: last7days_cases=%s, "
@@ -81,8 +216,10 @@ def process_covid_csv_data(covid_csv_data: list) -> tuple[int, int, int]:
 
 
 def covid_API_request(
-        location: str = "Exeter", location_type: str = "ltla") -> dict:
-    """Pull data from the API
+        location: str = "Exeter", location_type: str = "ltla") -> CovidSeries:
+    """Pull data from the API. Responses are cached for COVID_CACHE_TTL
+        seconds; after that the API's Last-Modified header is checked
+        and the data is only downloaded again if it has changed.
 
    :param location: Name of the location that is to  besent off to the news
         api to grab covid-19 stats.
@@ -90,8 +227,9 @@ def covid_API_request(
    :param location_type: Name of the type of location that is to be sent
         off to the news api to grab covid-19 stats.
    :type location_type: str
-   :return: Returns a dictionary of statical figures ordered by date
-   :rtype: dictionary
+   :return: Returns a column store of statical figures ordered by date,
+        newest first
+   :rtype: CovidSeries
     """
 
     logging.debug("Entered covid_API_request")
@@ -113,81 +251,176 @@ def covid_API_request(
         "newCasesBySpecimenDate": "newCasesBySpecimenDate"
     }
 
+    cache_key = (tuple(use_filters), tuple(get_structure.items()))
+    with _cache_lock:
+        cached = _response_cache.get(cache_key)
+        if cached is not None:
+            _response_cache.move_to_end(cache_key)
+            if time.monotonic() - cached['fetched_at'] < COVID_CACHE_TTL:
+                cache_stats['hits'] += 1
+                logging.debug("Serving cached covid data for %s", location)
+                return cached['series']
+
     use_api = uk_covid19.Cov19API(
         filters=use_filters,
         structure=get_structure
     )
 
-    data = use_api.get_csv()
-    data = data.splitlines()
-    firstline = data[1].strip()
-    firstline_list = firstline.split(",")
-
-    # Initialising dictionary
-    dictionary = {
-        "areaCode": firstline_list[0],
-        "areaName": firstline_list[1],
-        "areaType": firstline_list[2],
-        f"{firstline_list[3]}": {
-            "cumDailyNsoDeathsByDeathDate": firstline_list[4],
-            "hospitalCases": firstline_list[5],
-            "newCasesBySpecimenDate": firstline_list[6]}
-    }
+    # Only download the data again if it has changed since it was cached
+    if cached is not None and cached['last_update'] is not None:
+        if use_api.last_update == cached['last_update']:
+            with _cache_lock:
+                cached['fetched_at'] = time.monotonic()
+                cache_stats['revalidated'] += 1
+            logging.debug(
+                "Covid data for %s unchanged since %s",
+                location, cached['last_update'])
+            return cached['series']
+
+    series = CovidSeries.from_csv(use_api.get_csv())
+    if cached is not None:
+        series = merge_covid_history(cached['series'], series)
+    with _cache_lock:
+        cache_stats['misses'] += 1
+        _response_cache[cache_key] = {
+            'series': series,
+            # Read from the response headers of the request just made
+            'last_update': use_api.last_update,
+            'fetched_at': time.monotonic(),
+        }
+        _response_cache.move_to_end(cache_key)
+        while len(_response_cache) > COVID_CACHE_SIZE:
+            _response_cache.popitem(last=False)
 
-    # Filling in data starting from the line after initial
-    for line in data[2:]:
-        line = line.strip()
-        line = line.split(",")
-        dictionary[f"{line[3]}"] = {
-            "cumDailyNsoDeathsByDeathDate": line[4],
-            "hospitalCases": line[5],
-            "newCasesBySpecimenDate": line[6]}
+    logging.debug(
+        "Return value is: %s rows for %s", len(series), series.area_name)
+    return series
+
+
+def merge_covid_history(
+        series: CovidSeries, newer: CovidSeries) -> CovidSeries:
+    """ Diffs a newly downloaded full history against the series cached
+        for the same area, merging only the rows that changed into it.
+        A series whose figures didn't change keeps its revision, so its
+        stats aren't worked out again. Every day is compared, so days
+        revised after they were first published are picked up and the
+        result always matches the newly downloaded history.
+
+   :param series: Previously fetched series to update in place
+   :type series: CovidSeries
+   :param newer: Full history just downloaded for the same area
+   :type newer: CovidSeries
+   :return: Returns 'series' with the changes merged in, or 'newer' if
+        days were dropped or filled in rather than only added at the front
+   :rtype: CovidSeries
+    """
 
-    logging.debug("Return value is: %s", dictionary)
-    return dictionary
+    logging.debug("Entered merge_covid_history")
+    held = len(newer) - len(series)
+    if held < 0 or newer.dates[held:] != series.dates:
+        logging.debug("Covid history for %s was rewritten", newer.area_name)
+        return newer
+    changed = series.merge(newer)
+    logging.debug(
+        "Merged %s changed rows of %s", changed, series.area_name)
+    return series
 
 
-def process_covid_json_data(json_dict: dict) -> tuple[int, int, int]:
-    """ Takes in the dictionary found by covid_API_request
+def clear_covid_cache() -> None:
+    """ Empties the covid_API_request response cache and resets
+        its hit and miss counters.
+
+   :return: Doesn't return anything
+   :rtype: None
+    """
+    logging.debug("Entered clear_covid_cache")
+    with _cache_lock:
+        _response_cache.clear()
+        for counter in cache_stats:
+            cache_stats[counter] = 0
+
+
+def covid_API_request_many(
+        areas: list[tuple[str, str]],
+        timeout: float = COVID_FETCH_TIMEOUT
+        ) -> dict[tuple[str, str], CovidSeries]:
+    """Pull data for several areas from the API at the same time, on the
+        shared pool of COVID_FETCH_WORKERS threads
+
+   :param areas: List of (location, location_type) pairs to request
+   :type areas: list[tuple[str, str]]
+   :param timeout: Seconds all the areas together have to answer, from
+        when the call is made. Areas still outstanding then are given up on.
+   :type timeout: float
+   :return: Returns a dictionary mapping each (location, location_type)
+        pair that answered in time to what covid_API_request returned for
+        it. Areas that failed or timed out are logged and left out.
+   :rtype: dict[tuple[str, str], CovidSeries]
+    """
+
+    logging.debug("Entered covid_API_request_many")
+    logging.debug("areas value is: %s", areas)
+    areas = list(dict.fromkeys(areas))
+    results = {}
+    if not areas:
+        return results
+
+    futures = {
+        area: _fetch_executor.submit(covid_API_request, *area)
+        for area in areas}
+    deadline = time.monotonic() + timeout
+    for area, future in futures.items():
+        try:
+            results[area] = future.result(
+                timeout=max(deadline - time.monotonic(), 0))
+        except concurrent.futures.TimeoutError:
+            # Drop it from the pool's queue if it hasn't started yet
+            future.cancel()
+            logging.error(
+                "Request for %s (%s) to the 'uk_covid19' API didn't finish"
+                " within the %s second deadline.", area[0], area[1], timeout)
+        except (uk_covid19.exceptions.FailedRequestError,
+                IndexError, OSError):
+            logging.error(
+                "Request for %s (%s) to the 'uk_covid19' API failed.",
+                area[0], area[1], exc_info=True)
+
+    logging.debug("Areas returned: %s", list(results))
+    return results
+
+
+def process_covid_json_data(
+        json_dict: CovidSeries | dict) -> tuple[int, int, int]:
+    """ Takes in the series found by covid_API_request
         and returns total_deaths, current_hospital_cases and
         last7days_cases in a tuple of integer types.
         For each of these values, the function will look past
         empty values to get the most up-to-date and valid data.
+        The older date keyed dictionary layout is still accepted.
 
-   :param json_dict: Dictionary of covid-19 stats ordered by date
-        and returns total_deaths, current_hospital_cases and
-        last7days_cases in a tuple of integer types.
-   :type json_dict: dict
+   :param json_dict: Column store or dictionary of covid-19 stats
+        ordered by date
+   :type json_dict: CovidSeries or dict
    :return: Returns a tuple of statical figures
    :rtype: tuple[int, int, int]
     """
 
     logging.debug("Entered process_covid_json_data")
-    total_deaths = 0
-    current_hospital_cases = 0
-    last7days_cases = 0
-
-    for num in range(3, len(json_dict), 1):
-        date = list(json_dict.keys())[num]
-        if json_dict[date]['cumDailyNsoDeathsByDeathDate'] != "":
-            total_deaths = int(json_dict[date]['cumDailyNsoDeathsByDeathDate'])
-            break
-
-    for num in range(3, len(json_dict), 1):
-        date = list(json_dict.keys())[num]
-        if json_dict[date]['hospitalCases'] != "":
-            current_hospital_cases = int(json_dict[date]['hospitalCases'])
-            break
+    if isinstance(json_dict, CovidSeries):
+        rows = json_dict.rows()
+    else:
+        # Skip the areaCode, areaName and areaType entries
+        rows = (
+            (
+                day['cumDailyNsoDeathsByDeathDate'],
+                day['hospitalCases'],
+                day['newCasesBySpecimenDate']
+            )
+            for day in itertools.islice(json_dict.values(), 3, None)
+        )
+    total_deaths, current_hospital_cases, last7days_cases = \
+        compute_covid_metrics(rows)
 
-    cnt = 0
-    for num in range(3, len(json_dict), 1):
-        date = list(json_dict.keys())[num]
-        if cnt == 7:
-            break
-        if json_dict[date]['newCasesBySpecimenDate'] != "":
-            date = list(json_dict.keys())[num+1]
-            last7days_cases += int(json_dict[date]['newCasesBySpecimenDate'])
-            cnt += 1
     logging.debug(
         "Return value is: total_deaths=%s, "
         "current_hospital_cases=%s, "
@@ -197,6 +430,22 @@ def process_covid_json_data(json_dict: dict) -> tuple[int, int, int]:
     return total_deaths, current_hospital_cases, last7days_cases
 
 
+def format_growth(series: CovidSeries) -> str:
+    """ Formats the week-over-week change in 7-day infections
+        for display on the dashboard.
+
+   :param series: Series to work the change out from
+   :type series: CovidSeries
+   :return: Returns the change as a signed percentage, or "?" if
+        there isn't two weeks of data
+   :rtype: str
+    """
+    growth = covid_analytics.covid_trends(series)['growth']
+    if growth is None:
+        return "?"
+    return f"{growth:+.1f}%"
+
+
 def update_covid_stats(update_name: str) -> None:
     """ Triggered by 'schedule_covid_updates' when a scheduled
         update is set to update at a certain time.
@@ -217,40 +466,96 @@ def update_covid_stats(update_name: str) -> None:
             " Check config values and retry."
     )
 
+    local_area = (config['covid_minor'], config['covid_minor_id'])
+    nation_area = (config['covid_major'], config['covid_major_id'])
+    areas = list(dict.fromkeys([local_area, nation_area]))
+    results = covid_API_request_many(areas)
+
+    # Leave out areas whose series hasn't changed since the last update
+    changed = {
+        area: series for area, series in results.items()
+        if _computed_revisions.get(area) != series.revision
+    }
+
     try:
-        local_covid_dict = covid_API_request(
-            config['covid_minor'],
-            config['covid_minor_id'])
-        nation_covid_dict = covid_API_request(
-            config['covid_major'],
-            config['covid_major_id'])
-        covid_stats['deaths_total'] = "Total national deaths: " + \
-            str(process_covid_json_data(nation_covid_dict)[0])
-        covid_stats['hospital_cases'] = "National hospital cases: " + \
-            str(process_covid_json_data(nation_covid_dict)[1])
-        covid_stats['local_7day_infections'] = process_covid_json_data(
-            local_covid_dict)[2]
-        covid_stats['national_7day_infections'] = process_covid_json_data(
-            nation_covid_dict)[2]
+        if nation_area in changed:
+            total_deaths, hospital_cases, national_7day_infections = \
+                process_covid_json_data(results[nation_area])
+            covid_stats['deaths_total'] = "Total national deaths: " + \
+                str(total_deaths)
+            covid_stats['hospital_cases'] = "National hospital cases: " + \
+                str(hospital_cases)
+            covid_stats['national_7day_infections'] = \
+                national_7day_infections
+            covid_stats['national_7day_growth'] = format_growth(
+                results[nation_area])
+            for name in NATION_STATS:
+                _stat_areas[name] = nation_area
+        if local_area in changed:
+            covid_stats['local_7day_infections'] = process_covid_json_data(
+                results[local_area])[2]
+            covid_stats['local_7day_growth'] = format_growth(
+                results[local_area])
+            for name in LOCAL_STATS:
+                _stat_areas[name] = local_area
+    except IndexError:
+        logging.error(error_msg, exc_info=True)
+        return
+    for area, series in changed.items():
+        _computed_revisions[area] = series.revision
+    if changed:
+        data_version.bump("covid_stats")
+
+    if len(results) < len(areas):
+        logging.error(error_msg)
+    if results:
         covid_stats['from_update_event'] = update_name
+        save_covid_state()
         logging.info(
             "Data request to 'uk_covid19' API"
-            " was successful."
+            " was successful for %s of %s areas.", len(results), len(areas)
         )
-    except uk_covid19.exceptions.FailedRequestError:
-        logging.error(error_msg, exc_info=True)
-    except IndexError:
-        logging.error(error_msg, exc_info=True)
+
+
+def run_covid_update(
+        update_name: str, on_complete=None, due: float = None) -> None:
+    """ Runs a scheduled covid update, then tells 'on_complete' that
+        the update has finished, even if it failed. Other covid updates
+        due in the same minute are taken off the queue and share this
+        run.
+
+   :param update_name: Name of the update which the user set
+   :type update_name: str
+   :param on_complete: Called with update_name once the update is done
+   :type on_complete: callable
+   :param due: Time the update was scheduled for, or now if None
+   :type due: float
+   :return: Doesn't return anything
+   :rtype: None
+    """
+    if due is None:
+        due = time.time()
+    jobs = [(update_name, on_complete, due)] + \
+        update_jobs.take_due_events(s, run_covid_update, due)
+    try:
+        update_covid_stats(update_name)
+    finally:
+        for name, callback, _ in jobs:
+            if callback is not None:
+                callback(name)
 
 
 def schedule_covid_updates(
-        update_interval: int, update_name: str) -> sched.Event:
+        update_interval: int, update_name: str,
+        on_complete=None) -> sched.Event:
     """ Used to set updates to populate data on dashboard
 
    :param update_interval: Seconds until update triggeres
    :type update_interval: int
    :param update_name: Name of the update which the user set
    :type update_name: str
+   :param on_complete: Called with update_name once the update has run
+   :type on_complete: callable
    :return: Returns a scheduled event
    :rtype: sched.Event
     """
@@ -258,8 +563,8 @@ def schedule_covid_updates(
     logging.debug("Entered schedule_covid_updates")
     logging.debug("update_interval value is: %s", update_interval)
     logging.debug("Scheduled update_name is: %s", update_name)
-    return s.enter(
-        update_interval, 1, update_covid_stats, {update_name: update_name})
+    due = time.time() + update_interval
+    return s.enterabs(due, 1, run_covid_update, (update_name, on_complete, due))
 
 
 def cancel_covid_update(item: dict[str]) -> None:
@@ -273,16 +578,10 @@ def cancel_covid_update(item: dict[str]) -> None:
     """
     logging.debug("Entered cancel_covid_update")
     logging.debug("Cancelled covid event is: %s", str(item))
-    s.cancel(item['event'])
-
-
-def run_scheduled_covid_updates() -> None:
-    """ Run updates as defined by schedule_covid_updates
+    try:
+        s.cancel(item['event'])
+    except ValueError:
+        logging.debug("Covid event had already run")
 
-   :return: Doesn't return anything
-   :rtype: None
-    """
 
-    logging.debug("Entered run_scheduled_covid_updates")
-    logging.debug("Current covid scheduler queue is: \n%s", str(s.queue))
-    s.run(blocking=False)
+load_saved_covid_state()
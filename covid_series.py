@@ -0,0 +1,228 @@
+from __future__ import annotations
+import datetime
+import io
+import itertools
+import logging
+from array import array
+
+# Metric columns kept for every day, in the order they appear in the CSV
+# after areaCode, areaName, areaType and date
+METRICS = (
+    "cumDailyNsoDeathsByDeathDate",
+    "hospitalCases",
+    "newCasesBySpecimenDate",
+)
+
+# Source of revision numbers, shared by every series so that no two
+# series, or two states of one series, ever have the same revision
+_revisions = itertools.count(1)
+
+
+def iter_csv_rows(lines, skip_header: bool = True):
+    """ Lazily splits CSV lines into lists of column values, skipping
+        blank lines. Works on an open file, any other iterable of
+        lines, or a whole CSV payload passed in as a str or bytes,
+        such as the one returned by 'uk_covid19' get_csv().
+
+    :param lines: Source of CSV lines
+    :type lines: iterable, str or bytes
+    :param skip_header: Whether the first non-blank line is a header
+    :type skip_header: bool
+    :return: Yields one list of column values per row
+    :rtype: generator
+    """
+    if isinstance(lines, bytes):
+        lines = lines.decode("utf-8")
+    if isinstance(lines, str):
+        lines = io.StringIO(lines)
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if skip_header:
+            skip_header = False
+            continue
+        yield line.split(",")
+
+
+class CovidSeries:
+    """ Compact column store of covid-19 figures for one area.
+        Dates are kept as ordinal ints and each metric as an
+        array('i') with a matching bytearray mask that is 0 where
+        the API left the value blank. Rows keep the order they were
+        read in, which for the 'uk_covid19' API is newest first.
+    """
+
+    __slots__ = ("area_code", "area_name", "area_type", "dates",
+                 "values", "present", "revision")
+
+    def __init__(
+            self, area_code: str = "", area_name: str = "",
+            area_type: str = "") -> None:
+        self.area_code = area_code
+        self.area_name = area_name
+        self.area_type = area_type
+        self.dates = array('i')
+        self.values = {metric: array('i') for metric in METRICS}
+        self.present = {metric: bytearray() for metric in METRICS}
+        # Replaced with a new, higher number every time merge changes the
+        # series. Unique across all series, so it identifies both the
+        # series and its contents.
+        self.revision = next(_revisions)
+
+    @classmethod
+    def from_rows(cls, rows) -> CovidSeries:
+        """ Builds a series from already split CSV rows (without
+            the header row).
+
+        :param rows: Iterable of lists of column values
+        :type rows: iterable
+        :return: Returns the filled in series
+        :rtype: CovidSeries
+        """
+        series = cls()
+        dates = series.dates
+        columns = [
+            (series.values[metric], series.present[metric])
+            for metric in METRICS
+        ]
+        ordinal = datetime.date.fromisoformat
+        for row in rows:
+            if not series.area_name:
+                series.area_code, series.area_name, series.area_type = \
+                    row[0], row[1], row[2]
+            dates.append(ordinal(row[3]).toordinal())
+            for (values, present), value in zip(columns, row[4:7]):
+                if value:
+                    values.append(int(value))
+                    present.append(1)
+                else:
+                    values.append(0)
+                    present.append(0)
+        return series
+
+    @classmethod
+    def from_csv(cls, data: str | bytes) -> CovidSeries:
+        """ Builds a series straight from the CSV text or bytes
+            returned by the 'uk_covid19' API.
+
+        :param data: CSV payload including the header line
+        :type data: str or bytes
+        :raises IndexError: If the payload holds no data rows
+        :return: Returns the filled in series
+        :rtype: CovidSeries
+        """
+        logging.debug("Entered CovidSeries.from_csv")
+        series = cls.from_rows(iter_csv_rows(data))
+        if not series.dates:
+            raise IndexError("CSV payload has no data rows")
+        return series
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def date(self, index: int) -> datetime.date:
+        """ Returns the date of the row at 'index' """
+        return datetime.date.fromordinal(self.dates[index])
+
+    def value(self, metric: str, index: int) -> int | None:
+        """ Returns one metric for the row at 'index', or None if
+            it was left blank.
+        """
+        if self.present[metric][index]:
+            return self.values[metric][index]
+        return None
+
+    def rows(self):
+        """ Yields (deaths, hospital cases, new cases) triples in
+            row order with None for blank values, which is what
+            'covid_data_handler.compute_covid_metrics' expects.
+        """
+        columns = [
+            (self.values[metric], self.present[metric])
+            for metric in METRICS
+        ]
+        for index in range(len(self.dates)):
+            yield tuple(
+                values[index] if present[index] else None
+                for values, present in columns
+            )
+
+    def merge(self, newer: CovidSeries) -> int:
+        """ Merges rows from a more recent fetch into this series.
+            Days already held are overwritten where their figures
+            changed, and days newer than any held are added to the
+            front. Only the rows of 'newer' are walked, so the cost
+            depends on how many days were fetched rather than on the
+            length of the history.
+
+        :param newer: Series holding the recently fetched days
+        :type newer: CovidSeries
+        :return: Returns the number of rows added or changed
+        :rtype: int
+        """
+        logging.debug("Entered CovidSeries.merge")
+        if not self.area_name:
+            self.area_code, self.area_name, self.area_type = \
+                newer.area_code, newer.area_name, newer.area_type
+        latest = self.dates[0] if self.dates else None
+        # Index of each held day that 'newer' could overlap with
+        oldest_new = min(newer.dates, default=None)
+        positions = {}
+        for index, ordinal in enumerate(self.dates):
+            if oldest_new is None or ordinal < oldest_new:
+                break
+            positions[ordinal] = index
+
+        changed = 0
+        added = []
+        for index, ordinal in enumerate(newer.dates):
+            if latest is None or ordinal > latest:
+                added.append(index)
+                continue
+            position = positions.get(ordinal)
+            if position is None:
+                continue
+            row_changed = False
+            for metric in METRICS:
+                value = newer.values[metric][index]
+                present = newer.present[metric][index]
+                if self.values[metric][position] != value or \
+                        self.present[metric][position] != present:
+                    self.values[metric][position] = value
+                    self.present[metric][position] = present
+                    row_changed = True
+            changed += row_changed
+
+        if added:
+            added.sort(key=lambda index: newer.dates[index], reverse=True)
+            self.dates[0:0] = array('i', (newer.dates[i] for i in added))
+            for metric in METRICS:
+                self.values[metric][0:0] = array(
+                    'i', (newer.values[metric][i] for i in added))
+                self.present[metric][0:0] = bytearray(
+                    newer.present[metric][i] for i in added)
+            changed += len(added)
+
+        if changed:
+            self.revision = next(_revisions)
+        logging.debug("Merged %s changed rows into %s", changed,
+                      self.area_name)
+        return changed
+
+    def to_dict(self) -> dict:
+        """ Returns the series in the date keyed dictionary layout
+            that covid_API_request used to return.
+        """
+        dictionary = {
+            "areaCode": self.area_code,
+            "areaName": self.area_name,
+            "areaType": self.area_type,
+        }
+        for index in range(len(self.dates)):
+            dictionary[self.date(index).isoformat()] = {
+                metric: str(self.values[metric][index])
+                if self.present[metric][index] else ""
+                for metric in METRICS
+            }
+        return dictionary
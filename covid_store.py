@@ -0,0 +1,150 @@
+from __future__ import annotations
+import contextlib
+import json
+import logging
+import os
+import sqlite3
+from covid_series import CovidSeries, METRICS
+
+COVID_STORE_PATH = 'covid_cache.sqlite3'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS series (
+    cache_key TEXT PRIMARY KEY,
+    area_code TEXT,
+    area_name TEXT,
+    area_type TEXT,
+    last_update TEXT,
+    columns BLOB
+);
+CREATE TABLE IF NOT EXISTS area_stats (
+    name TEXT PRIMARY KEY,
+    area TEXT,
+    value TEXT
+);
+"""
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    connection = sqlite3.connect(path)
+    connection.executescript(_SCHEMA)
+    return connection
+
+
+def _pack_columns(series: CovidSeries) -> bytes:
+    """ Packs the date and metric columns of a series into one blob:
+        the dates, then each metric's values, then each metric's mask.
+    """
+    parts = [series.dates.tobytes()]
+    parts += [series.values[metric].tobytes() for metric in METRICS]
+    parts += [bytes(series.present[metric]) for metric in METRICS]
+    return b"".join(parts)
+
+
+def _unpack_columns(series: CovidSeries, blob: bytes) -> None:
+    """ Fills in the columns of an empty series from '_pack_columns' """
+    itemsize = series.dates.itemsize
+    # Each row takes one int for the date, one per metric and one
+    # mask byte per metric
+    rows = len(blob) // ((1 + len(METRICS)) * itemsize + len(METRICS))
+    size = rows * itemsize
+    series.dates.frombytes(blob[:size])
+    pos = size
+    for metric in METRICS:
+        series.values[metric].frombytes(blob[pos:pos + size])
+        pos += size
+    for metric in METRICS:
+        series.present[metric][:] = blob[pos:pos + rows]
+        pos += rows
+
+
+def save_covid_state(
+        entries: dict, stats: dict, path: str = COVID_STORE_PATH) -> None:
+    """ Writes the fetched series and the dashboard's covid stats to
+        disk so they survive a restart.
+
+    :param entries: Response cache entries keyed by (filters, structure)
+    :type entries: dict
+    :param stats: Covid stats shown on the dashboard, as a dictionary
+        of (area, value) tuples keyed by stat name, where 'area' is the
+        (location, location_type) the value was worked out for
+    :type stats: dict
+    :param path: SQLite file to write to
+    :type path: str
+    :return: Doesn't return anything
+    :rtype: None
+    """
+    logging.debug("Entered save_covid_state")
+    try:
+        with contextlib.closing(_connect(path)) as connection, connection:
+            # Series dropped from the cache are dropped from disk too
+            connection.execute("DELETE FROM series")
+            connection.executemany(
+                "INSERT OR REPLACE INTO series VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        json.dumps(cache_key),
+                        entry['series'].area_code,
+                        entry['series'].area_name,
+                        entry['series'].area_type,
+                        entry['last_update'],
+                        _pack_columns(entry['series']),
+                    )
+                    for cache_key, entry in entries.items()
+                ]
+            )
+            connection.execute("DELETE FROM area_stats")
+            connection.executemany(
+                "INSERT OR REPLACE INTO area_stats VALUES (?, ?, ?)",
+                [
+                    (name, json.dumps(area), json.dumps(value))
+                    for name, (area, value) in stats.items()
+                ]
+            )
+    except sqlite3.Error:
+        logging.error("Couldn't save covid data to %s", path, exc_info=True)
+
+
+def load_covid_state(path: str = COVID_STORE_PATH) -> tuple[dict, dict]:
+    """ Reads back what save_covid_state wrote.
+
+    :param path: SQLite file to read from
+    :type path: str
+    :return: Returns a tuple of the saved series, as a dictionary of
+        (series, last_update) tuples keyed by (filters, structure), and
+        the saved covid stats as (area, value) tuples keyed by name.
+        Both are empty if nothing was saved.
+    :rtype: tuple[dict, dict]
+    """
+    logging.debug("Entered load_covid_state")
+    entries = {}
+    stats = {}
+    if not os.path.exists(path):
+        return entries, stats
+    try:
+        with contextlib.closing(_connect(path)) as connection:
+            _load_rows(connection, entries, stats)
+    except (sqlite3.Error, ValueError):
+        logging.error(
+            "Couldn't load covid data from %s", path, exc_info=True)
+        return {}, {}
+    logging.debug("Loaded %s saved covid series", len(entries))
+    return entries, stats
+
+
+def _load_rows(
+        connection: sqlite3.Connection, entries: dict, stats: dict) -> None:
+    """ Reads the saved series and stats into 'entries' and 'stats' """
+    for cache_key, area_code, area_name, area_type, last_update, \
+            columns in connection.execute("SELECT * FROM series"):
+        series = CovidSeries(area_code, area_name, area_type)
+        _unpack_columns(series, columns)
+        filters, structure = json.loads(cache_key)
+        cache_key = (
+            tuple(filters),
+            tuple(tuple(item) for item in structure)
+        )
+        entries[cache_key] = (series, last_update)
+    for name, area, value in connection.execute(
+            "SELECT * FROM area_stats"):
+        stats[name] = (tuple(json.loads(area)), json.loads(value))
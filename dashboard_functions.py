@@ -1,13 +1,47 @@
 from __future__ import annotations
+import hashlib
+import json
 import logging
 import time
 import flask
+from markupsafe import Markup
 import news_data_handling
 import covid_data_handler
 import load_config
+import update_scheduler
+import data_version
+from recurrence import parse_recurrence
+from update_journal import UpdateJournal
+from update_registry import UpdateRegistry
 
-events = []
-updates = []
+NO_UPDATES_TITLE = 'No updates scheduled'
+
+# Scheduled update and notice toasts, by title and by scheduler event
+updates = UpdateRegistry()
+# Scheduled updates written to disk so they survive a restart
+journal = UpdateJournal()
+
+# (data version, config version) the index page was last rendered from,
+# the page and its ETag. Replaced as one tuple so request threads never
+# see a page with another render's key or ETag.
+_page_cache = (None, None, None)
+
+# Parts of the index page pushed to open dashboards when they change,
+# by the id of the element each one fills
+FRAGMENT_TEMPLATES = {
+    'covid-stats': '_stats.html',
+    'news-articles': '_articles.html',
+    'scheduled-updates': '_updates.html'
+}
+# (data version, config version) the fragments were last rendered from
+# and the fragments, replaced as one tuple like _page_cache
+_fragment_cache = (None, None)
+# Seconds between keepalive comments on an idle event stream
+SSE_KEEPALIVE_SECONDS = 15
+# Seconds an event stream stays open before the browser reconnects
+SSE_MAX_SECONDS = 300
+# Milliseconds the browser waits before reconnecting
+SSE_RETRY_MILLISECONDS = 3000
 
 
 def create_app() -> flask.app.Flask:
@@ -24,65 +58,203 @@ def create_app() -> flask.app.Flask:
     return app
     
 
-def render_index_page() -> None:
+def render_index_page(
+        articles: list[dict] = None,
+        search_query: str = "") -> tuple[str, str]:
     """ Uses found data from the news and covid APIs
         populates a template index page with news articles
         about covid-19 as well as statistical data that is
         relevant to user specified areas.
 
-    :return: Doesnt return anything.
-    :rtype: None
+    :param articles: Articles to show instead of the latest ones,
+        such as search results
+    :type articles: list[dict]
+    :param search_query: Search words to show in the search box
+    :type search_query: str
+    :return: Returns the rendered page and its ETag
+    :rtype: tuple[str, str]
     """
-    config = load_config.open_user_config()
-    return flask.render_template(
+    global _page_cache
+    config = load_config.get_config()
+    cache_key = None
+    if articles is None:
+        cache_key = (data_version.current(), config.version)
+        cached_key, page, etag = _page_cache
+        if cache_key == cached_key:
+            return page, etag
+        # Show only 5 articles at a time
+        articles = news_data_handling.news_articles[:config.max_articles]
+    page = flask.render_template(
         'index.html',
         favicon="favicon.ico",
         title='Dashboard',
-        location=(config['covid_minor']),
-        nation_location=(config['covid_major']),
-        # Show only 5 articles at a time
-        news_articles=(
-            news_data_handling.news_articles[
-                :int(config['max_articles'])
-                ]
-            ),
-        deaths_total=(
-            covid_data_handler.covid_stats['deaths_total']
-            ),
-        hospital_cases=(
-            covid_data_handler.covid_stats['hospital_cases']
-            ),
-        local_7day_infections=(
-            covid_data_handler.covid_stats['local_7day_infections']
-            ),
-        national_7day_infections=(
-            covid_data_handler.covid_stats['national_7day_infections']
-            ),
-        updates=updates,
-        image=config['image']
+        search_query=search_query,
+        image=config.image,
+        data_version=cache_key[0] if cache_key else data_version.current(),
+        **_fragment_context(config, articles)
     )
+    etag = hashlib.blake2b(page.encode(), digest_size=16).hexdigest()
+    if cache_key is not None:
+        _page_cache = (cache_key, page, etag)
+    return page, etag
+
+
+def _fragment_context(config, articles: list[dict]) -> dict:
+    """ Template values for the parts of the page that change as the
+        data does: the covid stats, the news articles and the update
+        toasts. Touches the articles shown so they stay stored.
+    """
+    for article in articles:
+        news_data_handling.news_articles.touch(article['title'])
+    stats = covid_data_handler.covid_stats
+    return {
+        'location': config.covid_minor,
+        'nation_location': config.covid_major,
+        'news_articles': articles,
+        'deaths_total': stats['deaths_total'],
+        'hospital_cases': stats['hospital_cases'],
+        'local_7day_infections': stats['local_7day_infections'],
+        'national_7day_infections': stats['national_7day_infections'],
+        'local_7day_growth': stats['local_7day_growth'],
+        'national_7day_growth': stats['national_7day_growth'],
+        'updates': updates
+    }
+
+
+def render_fragments() -> tuple[int, dict]:
+    """ Renders the parts of the index page that change as the data
+        does, keyed by the id of the element each one fills. Fragments
+        are cached until the data or config changes, so however many
+        dashboards are open they are only rendered once per change.
+
+    :return: Returns the data version the fragments were rendered
+        from and the fragments
+    :rtype: tuple[int, dict]
+    """
+    global _fragment_cache
+    config = load_config.get_config()
+    cache_key = (data_version.current(), config.version)
+    cached_key, fragments = _fragment_cache
+    if cache_key != cached_key:
+        context = _fragment_context(
+            config, news_data_handling.news_articles[:config.max_articles])
+        fragments = {
+            element_id: flask.render_template(template, **context)
+            for element_id, template in FRAGMENT_TEMPLATES.items()
+        }
+        _fragment_cache = (cache_key, fragments)
+    return cache_key[0], fragments
+
+
+def _sse_message(event: str, data: dict, version: int) -> str:
+    # The id is the data version, which the browser sends back as
+    # Last-Event-ID when it reconnects
+    return f"id: {version}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def event_stream(version: int = None):
+    """ Server-Sent Events stream for an open dashboard. Whenever the
+        data version changes, the fragments that changed are sent as
+        'fragment' events for the page's script to swap in. A comment
+        is sent every SSE_KEEPALIVE_SECONDS while nothing changes, and
+        the stream ends after SSE_MAX_SECONDS so the browser reconnects
+        and no connection is held forever.
+
+    :param version: Data version of the page that is connecting. If
+        it is current nothing is sent until the data changes.
+    :type version: int
+    :return: Yields the text of each event
+    :rtype: Iterator[str]
+    """
+    yield f"retry: {SSE_RETRY_MILLISECONDS}\n\n"
+    deadline = time.monotonic() + SSE_MAX_SECONDS
+    current, fragments = render_fragments()
+    # What the page already shows, so only changed fragments are sent
+    sent = dict(fragments) if current == version else {}
+    while True:
+        for element_id, html in fragments.items():
+            if sent.get(element_id) != html:
+                sent[element_id] = html
+                yield _sse_message(
+                    'fragment', {'id': element_id, 'html': html}, current)
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        if data_version.wait_for_change(current, min(
+                SSE_KEEPALIVE_SECONDS, remaining)) == current:
+            yield ": keepalive\n\n"
+        current, fragments = render_fragments()
+
+
+def render_event_response(version: int = None) -> flask.Response:
+    """ Streams 'event_stream' as a text/event-stream response. A
+    reconnecting browser's Last-Event-ID takes the place of 'version'.
+
+    :param version: Data version of the page that is connecting
+    :type version: int
+    :return: Returns the streaming response
+    :rtype: flask.Response
+    """
+    last_event_id = flask.request.headers.get('Last-Event-ID', '')
+    if last_event_id.isdigit():
+        version = int(last_event_id)
+    response = flask.Response(
+        flask.stream_with_context(event_stream(version)),
+        mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop proxies such as nginx buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def render_index_response() -> flask.Response:
+    """ Renders the index page as a response carrying an ETag, so a
+        browser that already has the current page gets a 304 Not
+        Modified instead of the whole page again.
+
+    :return: Returns the response to send
+    :rtype: flask.Response
+    """
+    page, etag = render_index_page()
+    response = flask.make_response(page)
+    response.set_etag(etag)
+    return response.make_conditional(flask.request)
+
+
+def render_search_page(query: str) -> str:
+    """ Renders the index page with the stored articles that best match
+        the search words in 'query' in place of the latest articles.
+
+    :param query: Search words
+    :type query: str
+    :return: Returns the rendered page
+    :rtype: str
+    """
+    logging.debug("Searching articles for: %s", query)
+    if not query or not query.strip():
+        return render_index_page()[0]
+    return render_index_page(
+        news_data_handling.search_articles(
+            query, load_config.get_config().max_articles),
+        query)[0]
 
 
 def calc_interval(update: str) -> int:
     """ Takes in time as HH:MM and compares it against current
-    time to generate the interval between them in seconds
+    time to generate the interval between them in seconds. A time
+    that has already passed today gives the interval until that time
+    tomorrow. Any recurrence 'parse_recurrence' accepts, such as a
+    cron expression or 'every 2h', gives the interval until it next
+    fires.
 
-    :param update: String of time in HH:MM format
+    :param update: String of time in HH:MM format, or a recurrence
     :type update: str
     :return: Calculates interval in seconds from a time in
         HH:MM format
     :rtype: int
     """
-    hours = update[0:2]
-    mins = update[3:5]
-    update = int(hours)*60*60 + int(mins)*60
-    current = time.strftime("%H:%M", time.localtime())
-    current = int(current[0:2])*60*60 + int(current[3:5])*60
-
-    if update > current:
-        interval = update - current
-    else:
-        interval = 24*60*60 + current - update
+    now = time.time()
+    interval = round(parse_recurrence(update).next_fire(now) - now)
     logging.debug(
         "calc_interval used. Original time: %s,"
         " converted interval: %s",
@@ -91,134 +263,191 @@ def calc_interval(update: str) -> int:
     return interval
 
 
+def next_interval(update: dict) -> int:
+    """ Works out how many seconds until an update toast is next due,
+    from its recurrence if it has one or else from its HH:MM time.
+
+    :param update: The update toast
+    :type update: dict
+    :return: Returns the seconds until the update should run
+    :rtype: int
+    """
+    return calc_interval(update.get('recurrence') or update['time'])
+
+
 def remove_expired_updates() -> None:
-    """ Checks if an event is finished and if so,
-    removes the event and update from their respective lists
+    """ Removes error toasts left over from the last request. Finished
+    updates are taken out of the registry by update_finished as soon
+    as they run, so nothing here has to look through the scheduler
+    queues.
 
     :return: Doesnt return anything.
     :rtype: None
     """
-
-    for index in range(len(updates)-1, -1, -1):
-        if updates[index]['type'] is None:
-            # Identify and remove system notices for blank
-            # update entry or init message
+    for item in updates:
+        if item['type'] is None and item['title'] != NO_UPDATES_TITLE:
             logging.debug(
-                "Removing system or error message: %s",
-                updates[index]['title']
-                )
-            updates.pop(index)
-        elif updates[index]['event'] not in covid_data_handler.s.queue and \
-                updates[index]['event'] not in news_data_handling.s.queue:
-            if updates[index]['type'] == 'covid_data' and \
-                    updates[index]['repeat'] == 1:
-                logging.debug(
-                    "Recheduling covid data update: %s",
-                    updates[index]['title']
-                    )
-                # remove old event from events list
-                events.remove(updates[index]['event'])
-                # append new event to events list
-                events.append(covid_data_handler.schedule_covid_updates(
-                    calc_interval(updates[index]['time']),
-                    updates[index]['title'])
-                )
-                # put copy of event in dictionary
-                updates[index]['event'] = events[-1]
-            elif updates[index]['type'] == 'news' and \
-                    updates[index]['repeat'] == 1:
-                logging.debug(
-                    "Recheduling news update: %s",
-                    updates[index]['title']
-                    )
-                # remove old event from events list
-                events.remove(updates[index]['event'])
-                # append new event to events list
-                events.append(news_data_handling.schedule_news_updates(
-                    calc_interval(updates[index]['time']),
-                    updates[index]['title'])
-                )
-                # put copy of event in dictionary
-                updates[index]['event'] = events[-1]
-            else:
-                logging.debug(
-                    "Removing update: %s",
-                    updates[index]['title']
-                    )
-                events.remove(updates[index]['event'])
-                updates.pop(index)
-
-
-def serve_toast_covid_data(update, covid_data, two, repeat, news) -> None:
+                "Removing system or error message: %s", item['title'])
+            updates.remove(item['title'])
+
+
+def _schedule_update(update: dict) -> object:
+    """ Schedules the next event for an update toast on the scheduler
+    that matches its type, returning the new event. Adding an event is
+    a push onto the scheduler's heap, so rescheduling is O(log n) in
+    the number of queued updates.
+    """
+    interval = next_interval(update)
+
+    def on_complete(title: str) -> None:
+        # Finish this toast rather than whatever now has its title
+        update_finished(update)
+
+    if update['type'] == 'covid_data':
+        return covid_data_handler.schedule_covid_updates(
+            interval, update['title'], on_complete)
+    return news_data_handling.schedule_news_updates(
+        interval, update['title'], on_complete)
+
+
+def update_finished(update: dict) -> None:
+    """ Called by the schedulers when an update has run. Repeating
+    updates are scheduled again for the next time their recurrence
+    fires and other updates are removed from the dashboard. Nothing
+    happens if the toast has since been dismissed, even if a new
+    update with the same title has been added.
+
+    :param update: The update toast that ran
+    :type update: dict
+    :return: Doesnt return anything.
+    :rtype: None
+    """
+    if updates.complete(update, _schedule_update):
+        journal.fire(update['title'])
+
+
+def _add_update(
+        update, two, repeat, update_type, name, recurrence=None) -> None:
+    """ Adds an update toast to the registry and schedules its event.
+    An update with a recurrence always repeats.
+    """
+    title = two + ' ' + name
+    if recurrence:
+        title += ' (repeat ' + recurrence + ')'
+        content = 'Scheduler set to update: ' + recurrence
+    else:
+        if repeat:
+            title += ' (repeat daily)'
+        content = 'Scheduler set to update news at: ' + update
+    item = {
+        'title': updates.unique_title(title),
+        'content': content,
+        'event': None,
+        'time': update,
+        'recurrence': recurrence,
+        'type': update_type,
+        'repeat': 1 if repeat or recurrence else 0
+    }
+    _register_update(item)
+    journal.schedule(item)
+    logging.debug(
+        "Added %s update with name: %s set for %s",
+        update_type, item['title'], update
+    )
+
+
+def _register_update(item: dict) -> None:
+    """ Adds an update toast to the registry and schedules its event """
+    # Add the toast before its event exists so a short interval can't
+    # finish the update before it is registered
+    updates.add(item)
+    updates.set_event(item['title'], _schedule_update(item))
+    updates.remove(NO_UPDATES_TITLE)
+
+
+def restore_updates() -> int:
+    """ Schedules again the updates recorded in the update journal, so
+    updates set before a restart aren't lost. Each one is set for the
+    next time its HH:MM comes round, the same as when it was first
+    scheduled. The journal is compacted afterwards.
+
+    :return: Returns the number of updates restored
+    :rtype: int
+    """
+    restored = 0
+    for item in journal.replay():
+        if item['title'] in updates or \
+                item['type'] not in ('covid_data', 'news'):
+            continue
+        item['event'] = None
+        try:
+            _register_update(item)
+        except ValueError:
+            logging.error("Can't restore update: %s", item, exc_info=True)
+            updates.remove(item['title'])
+            continue
+        restored += 1
+    journal.compact()
+    logging.info("Restored %s scheduled updates.", restored)
+    return restored
+
+
+def serve_toast_covid_data(
+        update, covid_data, two, repeat, news, recurrence=None) -> None:
     """ Sets up covid data toast notifcations that are selected
         via the dashboard form 
         """
-    if update and covid_data:
-        covid_data_title = two + ' covid data update'
-        events.append(covid_data_handler.schedule_covid_updates(
-            calc_interval(update), covid_data_title)
-            )
-        updates.append(
-            {
-                'title': covid_data_title,
-                'content': 'Scheduler set to update news at: ' + update,
-                'event': events[-1],
-                'time': update,
-                'type': 'covid_data'
-            }
-        )
-        logging.debug(
-            "Added covid data update with name: %s"
-            " set for %s",
-            covid_data_title, update
-        )
-        if repeat:
-            updates[-1]['repeat'] = 1
-            updates[-1]['title'] = two + ' covid data update (repeat daily)'
-        else:
-            updates[-1]['repeat'] = 0
-        if not news:
-            pass
+    if (update or recurrence) and covid_data:
+        _add_update(
+            update, two, repeat, 'covid_data', 'covid data update',
+            recurrence)
     flask.redirect('/index/', 302)
 
 
-def serve_toast_news(update, news, two, repeat) -> None:
+def serve_toast_news(update, news, two, repeat, recurrence=None) -> None:
     """ Sets up news toast notifcations that are selected
         via the dashboard form 
         """
-    if update and news:
-        news_title = two + ' news update'
-        events.append(news_data_handling.schedule_news_updates(
-            calc_interval(update), news_title)
-            )
-        updates.append(
+    if (update or recurrence) and news:
+        _add_update(update, two, repeat, 'news', 'news update', recurrence)
+
+
+def check_recurrence(recurrence: str) -> bool:
+    """ Checks a recurrence typed into the dashboard form, setting an
+    error toast if it isn't valid.
+
+    :param recurrence: Cron expression, interval or HH:MM time
+    :type recurrence: str
+    :return: Returns whether the recurrence is valid
+    :rtype: bool
+    """
+    try:
+        parse_recurrence(recurrence).next_fire(time.time())
+    except ValueError:
+        updates.add(
             {
-                'title': news_title,
-                'content': 'Scheduler set to update news at: ' + update,
-                'event': events[-1],
-                'time': update,
-                'type': 'news'
+                'title': '400 Error - Invalid repeat schedule',
+                'content': Markup(
+                    "<p style=\"color:red;\">No update was set. Use a \
+                    cron expression such as */30 * * * *, an interval \
+                    such as every 2h, or leave the field blank.</p>"),
+                'event': None,
+                'time': None,
+                'type': None
             }
         )
-        logging.debug(
-            "Added news update with name: %s"
-            " set for %s",
-            news_title, update
-        )
-        if repeat:
-            updates[-1]['repeat'] = 1
-            updates[-1]['title'] = two + ' news update (repeat daily)'
-        else:
-            updates[-1]['repeat'] = 0
+        logging.debug("Invalid repeat schedule: %s", recurrence)
+        return False
+    return True
 
 
 def set_form_error_msgs(update, news, covid_data) -> None:
     """ Sets error messages as toast notifications """
     if update and not news and not covid_data:
-        updates.append(
+        updates.add(
             {
                 'title': '449 Error - Insufficient input',
-                'content': flask.Markup(
+                'content': Markup(
                     "<p style=\"color:red;\">No update was set. Please try \
                     again making sure to use the checkboxes provided to \
                     select an update.</p>"),
@@ -231,10 +460,11 @@ def set_form_error_msgs(update, news, covid_data) -> None:
             "Setting '449 Error - Insufficient input' error message."
             )
 
-    if not update and not updates:
-        updates.append(
+    if not update and NO_UPDATES_TITLE not in updates and \
+            all(item['type'] is None for item in updates):
+        updates.add(
             {
-                'title': 'No updates scheduled',
+                'title': NO_UPDATES_TITLE,
                 'content': 'Use the form to schedule selected updates.',
                 'event': None,
                 'time': update,
@@ -260,20 +490,20 @@ def digest_toast(notif, update_item):
 
     if update_item:
         # Cancels selected scheduler event and removes
-        # notification from dictionary
-        for item in updates:
-            if item['type'] == 'covid_data' and item['title'] == update_item:
-                covid_data_handler.cancel_covid_update(item)
-                events.remove(item['event'])
-                updates.remove(item)
-                logging.debug(
-                    "Removing covid data event and nofication: %s", item)
-            elif item['type'] == 'news' and item['title'] == update_item:
-                news_data_handling.cancel_news_update(item)
-                events.remove(item['event'])
-                updates.remove(item)
-                logging.debug(
-                    "Removing news event and nofication: %s", item)
+        # notification from the registry
+        item = updates.remove(update_item)
+        if item is None:
+            return
+        if item['type'] is not None:
+            journal.cancel(item['title'])
+        if item['type'] == 'covid_data':
+            covid_data_handler.cancel_covid_update(item)
+            logging.debug(
+                "Removing covid data event and nofication: %s", item)
+        elif item['type'] == 'news':
+            news_data_handling.cancel_news_update(item)
+            logging.debug(
+                "Removing news event and nofication: %s", item)
 
 
 def request_handler() -> None:
@@ -291,13 +521,19 @@ def request_handler() -> None:
     news = flask.request.args.get('news')
     update_item = flask.request.args.get('update_item')
     notif = flask.request.args.get('notif')
+    recurrence = flask.request.args.get('recurrence', '').strip() or None
 
     news_data_handling.clear_newsapi_error_msgs()
     remove_expired_updates()
-    serve_toast_covid_data(update, covid_data, two, repeat, news)
-    serve_toast_news(update, news, two, repeat)
-    set_form_error_msgs(update, news, covid_data)
+    if recurrence and not check_recurrence(recurrence):
+        update = recurrence = None
+    serve_toast_covid_data(
+        update, covid_data, two, repeat, news, recurrence)
+    serve_toast_news(update, news, two, repeat, recurrence)
+    set_form_error_msgs(update or recurrence, news, covid_data)
     digest_toast(notif, update_item)
+    # Let the background scheduler pick up any new or cancelled events
+    update_scheduler.wake_update_scheduler()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,52 @@
+from __future__ import annotations
+import logging
+import threading
+
+_version = 0
+_lock = threading.Lock()
+# Notified whenever the version changes, for anything waiting on it
+_changed = threading.Condition(_lock)
+
+
+def bump(reason: str = "") -> int:
+    """ Records that data shown on the dashboard has changed, so any
+        page rendered from the old data is out of date.
+
+    :param reason: What changed, for the log
+    :type reason: str
+    :return: Returns the new data version
+    :rtype: int
+    """
+    global _version
+    with _changed:
+        _version += 1
+        version = _version
+        _changed.notify_all()
+    logging.debug("Data version is now %s (%s)", version, reason)
+    return version
+
+
+def current() -> int:
+    """ Returns the current data version
+
+    :return: Returns the data version
+    :rtype: int
+    """
+    return _version
+
+
+def wait_for_change(version: int, timeout: float = None) -> int:
+    """ Blocks until the data version is no longer 'version', or until
+        'timeout' seconds have passed.
+
+    :param version: Data version the caller already has
+    :type version: int
+    :param timeout: Most seconds to wait, or None to wait forever
+    :type timeout: float
+    :return: Returns the current data version, which is still
+        'version' if the wait timed out
+    :rtype: int
+    """
+    with _changed:
+        _changed.wait_for(lambda: _version != version, timeout)
+        return _version
@@ -0,0 +1,126 @@
+from __future__ import annotations
+import logging
+import threading
+import time
+import requests
+import requests.adapters
+import urllib3.util.retry
+
+# Seconds to wait for a connection to open, and for a response once it has
+NEWS_CONNECT_TIMEOUT = 3.05
+NEWS_READ_TIMEOUT = 10
+# Retries for failed connections and for the status codes below. Waits
+# grow as NEWS_BACKOFF_FACTOR * 2 ** retry seconds plus up to
+# NEWS_BACKOFF_JITTER seconds of random jitter.
+NEWS_MAX_RETRIES = 3
+NEWS_BACKOFF_FACTOR = 0.5
+NEWS_BACKOFF_JITTER = 0.5
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Connections kept open per host
+POOL_SIZE = 10
+
+http_stats = {
+    'requests': 0,
+    'retries': 0,
+    'failures': 0,
+    'seconds': 0.0,
+}
+
+_session = None
+_lock = threading.Lock()
+
+
+def _build_session() -> requests.Session:
+    """ Builds a session that keeps connections alive in a pool and
+        retries failed requests with exponential backoff and jitter.
+    """
+    retry = urllib3.util.retry.Retry(
+        total=NEWS_MAX_RETRIES,
+        backoff_factor=NEWS_BACKOFF_FACTOR,
+        backoff_jitter=NEWS_BACKOFF_JITTER,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(['GET', 'HEAD']),
+        respect_retry_after_header=True,
+        # Hand the last response back rather than raising, so the
+        # caller can read the API's error message
+        raise_on_status=False,
+    )
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE,
+        max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers['Accept-Encoding'] = 'gzip, deflate'
+    return session
+
+
+def get_session() -> requests.Session:
+    """ Returns the shared session, building it on first use.
+
+    :return: Returns the pooled, retrying session
+    :rtype: requests.Session
+    """
+    global _session
+    with _lock:
+        if _session is None:
+            logging.debug("Building shared HTTP session")
+            _session = _build_session()
+        return _session
+
+
+def reset_session() -> None:
+    """ Closes the shared session so the next request builds a new one,
+        picking up any changed settings. Also resets http_stats.
+
+    :return: Doesn't return anything
+    :rtype: None
+    """
+    global _session
+    with _lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+        for name in http_stats:
+            http_stats[name] = 0
+        http_stats['seconds'] = 0.0
+
+
+def http_get(url: str, timeout: tuple[float, float] = None,
+             **kwargs) -> requests.Response:
+    """ Sends a GET request through the shared session.
+
+    :param url: URL to request
+    :type url: str
+    :param timeout: (connect, read) timeouts in seconds. Defaults to
+        NEWS_CONNECT_TIMEOUT and NEWS_READ_TIMEOUT.
+    :type timeout: tuple[float, float]
+    :raises requests.exceptions.RequestException: If the request still
+        fails once retries are used up
+    :return: Returns the response
+    :rtype: requests.Response
+    """
+    if timeout is None:
+        timeout = (NEWS_CONNECT_TIMEOUT, NEWS_READ_TIMEOUT)
+    session = get_session()
+    start = time.monotonic()
+    try:
+        response = session.get(url, timeout=timeout, **kwargs)
+    except requests.exceptions.RequestException:
+        with _lock:
+            http_stats['requests'] += 1
+            http_stats['failures'] += 1
+            http_stats['seconds'] += time.monotonic() - start
+        raise
+    retries = getattr(response.raw, 'retries', None)
+    with _lock:
+        http_stats['requests'] += 1
+        http_stats['seconds'] += time.monotonic() - start
+        if retries is not None:
+            http_stats['retries'] += len(retries.history)
+        if not response.ok:
+            http_stats['failures'] += 1
+    logging.debug(
+        "GET returned %s in %.3f seconds",
+        response.status_code, time.monotonic() - start)
+    return response
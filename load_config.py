@@ -1,5 +1,60 @@
+from __future__ import annotations
+import dataclasses
 import json
 import logging
+import os
+import threading
+import time
+import types
+
+CONFIG_PATH = 'config.json'
+# Seconds between checks of whether config.json has changed on disk.
+# Config reads in between are served from memory.
+CONFIG_CHECK_INTERVAL = 2.0
+
+DEFAULT_CONFIG = {
+    "covid_minor": "Exeter",
+    "covid_minor_id": "ltla",
+    "covid_major": "England",
+    "covid_major_id": "nation",
+    "news_api_url_stub": "https://newsapi.org/v2/everything?",
+    "news_keywords": "Covid COVID-19 coronavirus",
+    "news_API_key": "",
+    "news_lang": "en",
+    "domains": "",
+    "sort": "relevancy",
+    "max_articles": "5",
+    "max_article_age": "",
+    "image": "covid.png"
+}
+
+
+@dataclasses.dataclass(frozen=True)
+class UserConfig:
+    """ Parsed and validated contents of config.json.
+        'raw' holds the values exactly as they are in the file, and
+        'version' goes up by one every time the file is reloaded.
+    """
+    covid_minor: str
+    covid_minor_id: str
+    covid_major: str
+    covid_major_id: str
+    news_api_url_stub: str
+    news_keywords: str
+    news_API_key: str
+    news_lang: str
+    domains: str
+    sort: str
+    image: str
+    max_articles: int
+    max_article_age: int | None
+    raw: types.MappingProxyType
+    version: int
+
+
+_lock = threading.Lock()
+_cache = {'config': None, 'stamp': None, 'checked': 0.0, 'version': 0}
+
 
 def use_log() -> None:
     """ Opens the logger to keep track of errors and
@@ -20,134 +75,123 @@ def use_log() -> None:
         )
 
 
-def open_user_config() -> dict:
-    """ Opens a config.json file to keep track of constants
-        that are potentially customisable or changeable
-        outside of the program.
-        Also it handles any errors that might incur when 
-        reading the config. If it detects that the config
-        might have been tampered with, corrupted or
-        deleted, then it will create a new config.json
-        file with defaults pre-loaded.
+def _parse_config(config: dict, version: int) -> UserConfig:
+    """ Checks every expected entry is in the config and builds the
+        typed config from it.
 
-    :return: Returns a dictionary which can be used by
-        other parts of the program.
-    :rtype: dict
+    :raises KeyError: If an entry is missing
+    :raises ValueError: If max_articles or max_article_age isn't a
+        whole number
+    """
+    fields = {
+        key: str(config[key]) for key in DEFAULT_CONFIG
+    }
+    fields['max_articles'] = int(fields['max_articles'])
+    fields['max_article_age'] = int(fields['max_article_age']) \
+        if fields['max_article_age'] else None
+    return UserConfig(
+        **fields, raw=types.MappingProxyType(config), version=version)
+
+
+def _write_default_config() -> None:
+    """ Writes config.json using the default values """
+    with open(CONFIG_PATH, 'w', encoding="utf-8") as file:
+        json.dump(DEFAULT_CONFIG, file, indent='\t')
+
+
+def _file_stamp() -> tuple | None:
+    """ Returns what identifies the current config.json on disk, or
+        None if it doesn't exist.
     """
     try:
-        with open('config.json', "r", encoding="utf-8") as file:
-            config = json.load(file)
-            file.close()
-        test = (
-            config['covid_minor'] +
-            config['covid_minor_id'] +
-            config['covid_major'] +
-            config['covid_major_id'] +
-            config['news_api_url_stub'] +
-            config['news_keywords'] +
-            config['news_API_key'] +
-            config['news_lang'] +
-            config['domains'] +
-            config['sort'] +
-            config['image'] +
-            config['max_articles'] +
-            config['max_article_age']
-        )
-        if test:
-            pass
+        stat = os.stat(CONFIG_PATH)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_ino, stat.st_size)
 
-        if config['max_articles']:
-            int(config['max_articles'])
-        if config['max_article_age']:
-            int(config['max_article_age'])
-        return config
+
+def _load_config(version: int) -> UserConfig:
+    """ Reads and validates config.json. If it looks like it has been
+        tampered with, corrupted or deleted, a new config.json is
+        created with defaults pre-loaded.
+    """
+    try:
+        with open(CONFIG_PATH, "r", encoding="utf-8") as file:
+            return _parse_config(json.load(file), version)
 
     except KeyError:
         print(
             "Data entries in config.json missing or corrupted. "
             "Reinitialising config.json file using default values."
             )
-        with open('config.json', 'w', encoding="utf-8") as file:
-            file.write(
-                '{\n'
-                '\t"covid_minor": "Exeter",\n'
-                '\t"covid_minor_id": "ltla",\n'
-                '\t"covid_major": "England",\n'
-                '\t"covid_major_id": "nation",\n'
-                '\t"news_api_url_stub": '
-                '"https://newsapi.org/v2/everything?",\n'
-                '\t"news_keywords": "Covid COVID-19 coronavirus",\n'
-                '\t"news_API_key": "",\n'
-                '\t"news_lang": "en",\n'
-                '\t"domains": "",\n'
-                '\t"sort": "relevancy",\n'
-                '\t"max_articles": "5",\n'
-                '\t"max_article_age": "",\n'
-                '\t"image": "covid.png"\n'
-                '}'
-            )
-            file.close()
-        with open('config.json', "r", encoding="utf-8") as file:
-            config = json.load(file)
-            file.close()
-            return config
-
     except FileNotFoundError:
         print(
             "Config file not found. "
             "config.json file created using default values."
             )
-        with open('config.json', 'w', encoding="utf-8") as file:
-            file.write(
-                '{\n'
-                '\t"covid_minor": "Exeter",\n'
-                '\t"covid_minor_id": "ltla",\n'
-                '\t"covid_major": "England",\n'
-                '\t"covid_major_id": "nation",\n'
-                '\t"news_api_url_stub": '
-                '"https://newsapi.org/v2/everything?",\n'
-                '\t"news_keywords": "Covid COVID-19 coronavirus",\n'
-                '\t"news_API_key": "",\n'
-                '\t"news_lang": "en",\n'
-                '\t"domains": "",\n'
-                '\t"sort": "relevancy",\n'
-                '\t"max_articles": "5",\n'
-                '\t"max_article_age": "",\n'
-                '\t"image": "covid.png"\n'
-                '}'
-            )
-            file.close()
-        with open('config.json', "r", encoding="utf-8") as file:
-            config = json.load(file)
-            file.close()
-            return config
-
     except ValueError:
         print(
             "Unknown character(s) in config.json where integer expected."
             " Please check max_articles and max_article_age. "
             "config.json file created using default values."
             )
-        with open('config.json', 'w', encoding="utf-8") as file:
-            file.write(
-                '{\n'
-                '\t"covid_minor": "Exeter",\n'
-                '\t"covid_minor_id": "ltla",\n'
-                '\t"covid_major": "England",\n'
-                '\t"covid_major_id": "nation",\n'
-                '\t"news_api_url_stub": '
-                '"https://newsapi.org/v2/everything?",\n'
-                '\t"news_keywords": "Covid COVID-19 coronavirus",\n'
-                '\t"news_API_key": "",\n'
-                '\t"news_lang": "en",\n'
-                '\t"domains": "",\n'
-                '\t"sort": "relevancy",\n'
-                '\t"max_articles": "5",\n'
-                '\t"max_article_age": "",\n'
-                '\t"image": "covid.png"\n'
-                '}'
-            )
-            file.close()
-        with open('config.json', "r", encoding="utf-8") as file:
-            config = json.load(file)
-            file.close()
+    _write_default_config()
+    return _parse_config(dict(DEFAULT_CONFIG), version)
+
+
+def get_config() -> UserConfig:
+    """ Returns the parsed config. config.json is only read again when
+        it has changed on disk, and that is checked at most once every
+        CONFIG_CHECK_INTERVAL seconds, so most calls don't touch the
+        file system at all.
+
+    :return: Returns the typed config
+    :rtype: UserConfig
+    """
+    now = time.monotonic()
+    with _lock:
+        config = _cache['config']
+        if config is not None and \
+                now - _cache['checked'] < CONFIG_CHECK_INTERVAL:
+            return config
+        _cache['checked'] = now
+        stamp = _file_stamp()
+        if config is not None and stamp is not None and \
+                stamp == _cache['stamp']:
+            return config
+        return _reload()
+
+
+def _reload() -> UserConfig:
+    """ Loads config.json into the cache. Must be called holding _lock. """
+    _cache['version'] += 1
+    config = _load_config(_cache['version'])
+    _cache['config'] = config
+    _cache['stamp'] = _file_stamp()
+    _cache['checked'] = time.monotonic()
+    logging.debug("Loaded config.json, version %s", config.version)
+    return config
+
+
+def reload_config() -> UserConfig:
+    """ Reads config.json again straight away, whether or not it looks
+        like it has changed.
+
+    :return: Returns the typed config
+    :rtype: UserConfig
+    """
+    with _lock:
+        return _reload()
+
+
+def open_user_config() -> types.MappingProxyType:
+    """ Returns the values from config.json as a read-only dictionary,
+        keeping track of constants that are potentially customisable or
+        changeable outside of the program. See get_config for how the
+        file is cached.
+
+    :return: Returns a dictionary which can be used by
+        other parts of the program.
+    :rtype: types.MappingProxyType
+    """
+    return get_config().raw
@@ -1,16 +1,44 @@
 from __future__ import annotations
 import logging
+import os
+import threading
 import flask
-import covid_data_handler
-import news_data_handling
 import dashboard_functions
 import load_config
+import update_scheduler
 
 app = dashboard_functions.create_app()
 
 load_config.use_log()
 logging.info("App initialised. Standing by to run.")
 
+_startup_lock = threading.Lock()
+_started = False
+
+
+def start_app() -> None:
+    """ Starts the background update scheduler and schedules again the
+    updates recorded in the update journal before the last restart.
+    Runs once, when this module is loaded by 'python main.py',
+    'flask run' or a WSGI server, so restored updates fire whether or
+    not anyone opens the dashboard. Setting the DASHBOARD_SKIP_STARTUP
+    environment variable skips it, e.g. for the tests.
+
+    :rtype: None
+    :return: Doesn't return anything
+    """
+    global _started
+    with _startup_lock:
+        if _started:
+            return
+        _started = True
+    update_scheduler.start_update_scheduler()
+    dashboard_functions.restore_updates()
+
+
+if not os.environ.get('DASHBOARD_SKIP_STARTUP'):
+    start_app()
+
 
 @app.errorhandler(404)
 def page_not_found(err: int) -> callable:
@@ -36,29 +64,60 @@ def page_not_found(err: int) -> callable:
 @app.route('/index/', methods=['GET'])
 def index() -> callable:
     """ Core function that runs the server.
-    This function will be ran every 60 seconds due to the html template
-    refresh rate. This is to create a loop that will keep running the
-    event scheduler (sched).
+    Open pages are kept up to date through the '/events' stream, so
+    this only runs when the page is loaded or the form is submitted
+    (or every 60 seconds in browsers without JavaScript).
     The 'request_handler' function will be ran to check for any GET requests
     containing data collected by user input on the form displayed by the
     index template.
-    If there are any events queued, then they will be ran via the
-    'run_scheduled_news_updates' and 'run_scheduled_covid_updates' function
-    calls.
+    Queued events are not ran here: the background thread started by
+    'update_scheduler.start_update_scheduler' fires them on time, so
+    rendering the page never waits on the news or covid APIs.
+
+    The rendered page is cached until the data on it changes, and
+    browsers that already have the current page get a 304 response.
 
     :rtype: callable
-    :return: Calls the 'render_index_page' function to render the
+    :return: Calls the 'render_index_response' function to render the
     'index.html' web page to the user's browser.
     """
     logging.info(
         "Page refresh or user requested root/index page."
         " Data may have been updated.")
 
-    news_data_handling.run_scheduled_news_updates()
-    covid_data_handler.run_scheduled_covid_updates()
     dashboard_functions.request_handler()
 
-    return dashboard_functions.render_index_page()
+    return dashboard_functions.render_index_response()
+
+
+@app.route('/events', methods=['GET'])
+def events() -> callable:
+    """ Server-Sent Events stream that pushes the parts of the dashboard
+    that have changed to an open page, in place of reloading the whole
+    page every minute. The page passes the data version it was rendered
+    from in the 'version' query parameter.
+
+    :rtype: callable
+    :return: Calls the 'render_event_response' function to stream the
+    changes to the user's browser.
+    """
+    logging.info("Dashboard opened an event stream.")
+    return dashboard_functions.render_event_response(
+        flask.request.args.get('version', type=int))
+
+
+@app.route('/search', methods=['GET'])
+def search() -> callable:
+    """ Shows the dashboard with the stored news articles that best
+    match the search words in the 'q' query parameter.
+
+    :rtype: callable
+    :return: Calls the 'render_search_page' function to render the
+    'index.html' web page with the search results.
+    """
+    logging.info("User searched the stored news articles.")
+    return dashboard_functions.render_search_page(
+        flask.request.args.get('q', ''))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,133 @@
+from __future__ import annotations
+import hashlib
+import random
+import re
+import threading
+
+_WORD = re.compile(r"\w+")
+# Mersenne prime used for the MinHash permutations
+_PRIME = (1 << 61) - 1
+
+
+def shingles(text: str, size: int = 3) -> set[str]:
+    """ Splits text into overlapping runs of 'size' lower case words.
+        Text shorter than 'size' words gives a single shingle.
+
+    :param text: Text to split
+    :type text: str
+    :param size: Number of words per shingle
+    :type size: int
+    :return: Returns the set of shingles
+    :rtype: set[str]
+    """
+    words = _WORD.findall(text.lower())
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {
+        " ".join(words[index:index + size])
+        for index in range(len(words) - size + 1)
+    }
+
+
+class NearDuplicateIndex:
+    """ Finds texts that are near copies of ones already added, such as
+        the same news story syndicated under a slightly different
+        headline. Each text is reduced to a MinHash signature of its
+        word shingles, and signatures are split into bands that are
+        hashed into buckets (locality sensitive hashing), so a lookup
+        only compares against texts sharing at least one bucket.
+    """
+
+    def __init__(
+            self, threshold: float = 0.7, num_perm: int = 64,
+            bands: int = 16, shingle_size: int = 3, seed: int = 1) -> None:
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self._rows = num_perm // bands
+        generator = random.Random(seed)
+        self._permutations = [
+            (generator.randrange(1, _PRIME), generator.randrange(_PRIME))
+            for _ in range(num_perm)
+        ]
+        self._signatures = {}
+        self._buckets = [{} for _ in range(bands)]
+        # News updates add texts from the scheduler thread while
+        # dismissed articles are removed on request threads
+        self._lock = threading.Lock()
+
+    def signature(self, text: str) -> tuple[int, ...]:
+        """ Returns the MinHash signature of a text """
+        hashes = [
+            int.from_bytes(
+                hashlib.blake2b(shingle.encode(), digest_size=8).digest(),
+                "big")
+            for shingle in shingles(text, self.shingle_size)
+        ] or [0]
+        return tuple(
+            min((a * value + b) % _PRIME for value in hashes)
+            for a, b in self._permutations
+        )
+
+    def _bands(self, signature: tuple[int, ...]):
+        rows = self._rows
+        for band in range(len(self._buckets)):
+            yield band, signature[band * rows:(band + 1) * rows]
+
+    def find(self, text: str) -> object | None:
+        """ Looks for an added text that is at least 'threshold' similar.
+
+        :param text: Text to look up
+        :type text: str
+        :return: Returns the key of the most similar added text, or None
+            if there isn't one similar enough
+        :rtype: object
+        """
+        signature = self.signature(text)
+        with self._lock:
+            candidates = set()
+            for band, rows in self._bands(signature):
+                candidates.update(self._buckets[band].get(rows, ()))
+            others = [
+                (key, self._signatures[key]) for key in candidates
+                if key in self._signatures
+            ]
+        best_key = None
+        best_score = self.threshold
+        for key, other in others:
+            score = sum(
+                mine == theirs for mine, theirs in zip(signature, other)
+            ) / len(signature)
+            if score >= best_score:
+                best_key, best_score = key, score
+        return best_key
+
+    def add(self, key: object, text: str) -> None:
+        """ Adds a text under 'key', replacing any text already there """
+        signature = self.signature(text)
+        with self._lock:
+            self._remove(key)
+            self._signatures[key] = signature
+            for band, rows in self._bands(signature):
+                self._buckets[band].setdefault(rows, set()).add(key)
+
+    def remove(self, key: object) -> None:
+        """ Removes the text added under 'key', if any """
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key: object) -> None:
+        signature = self._signatures.pop(key, None)
+        if signature is None:
+            return
+        for band, rows in self._bands(signature):
+            bucket = self._buckets[band].get(rows)
+            if bucket is None:
+                continue
+            bucket.discard(key)
+            if not bucket:
+                del self._buckets[band][rows]
+
+    def __len__(self) -> int:
+        return len(self._signatures)
@@ -1,157 +1,134 @@
 from __future__ import annotations
+import concurrent.futures
 import sched
 import time
 import requests
-import flask
+from markupsafe import Markup
 import load_config
-import datetime
+import http_client
+import data_version
+import update_jobs
 import logging
+import re
 import simplejson
-
+from article_store import ArticleStore, TitleBlacklist
+from news_query import NewsQueryBuilder
+from near_duplicates import NearDuplicateIndex
+from article_search import ArticleIndex
+
+# Only ever run by the update_scheduler thread, so news updates never
+# overlap and, with same-minute updates sharing a run, each due time
+# fetches from the API once
 s = sched.scheduler(time.time, time.sleep)
 
-news_articles = []
-blacklist = []
-config = load_config.open_user_config()
+# Articles asked for per page, and the most pages read per query set
+NEWS_PAGE_SIZE = 20
+NEWS_MAX_PAGES = 3
+# How alike (0 to 1) an article's title and content must be to a stored
+# article's to be treated as a copy of the same story
+NEWS_SIMILARITY_THRESHOLD = 0.7
+# Most articles held at once, and how old (by 'publishedAt') they may
+# get before being dropped
+NEWS_MAX_STORED_ARTICLES = 500
+NEWS_MAX_STORED_AGE = 7 * 24 * 60 * 60
+# Most dismissed titles remembered, and for how long
+NEWS_BLACKLIST_SIZE = 10_000
+NEWS_BLACKLIST_AGE = 30 * 24 * 60 * 60
+
+news_articles = ArticleStore(NEWS_MAX_STORED_ARTICLES, NEWS_MAX_STORED_AGE)
+blacklist = TitleBlacklist(NEWS_BLACKLIST_SIZE, NEWS_BLACKLIST_AGE)
+_query_builder = NewsQueryBuilder()
+near_duplicates = NearDuplicateIndex(NEWS_SIMILARITY_THRESHOLD)
+article_index = ArticleIndex()
+
+
+# Characters that change state while stripping html, for text outside
+# a tag, inside a tag and inside a quoted attribute value
+_OUTSIDE_TAG = re.compile(r"[<>]")
+_INSIDE_TAG = re.compile(r"[>\"']")
+_INSIDE_QUOTE = re.compile(r"[\"']")
 
 
 def remove_html_tags(article_content: str) -> str:
-    """ Removes html tags in string text """
+    """ Removes html tags in string text.
+        Scans from one '<', '>' or quote to the next, so each character
+        is looked at once and the kept text is joined in one go.
+        A '>' inside a quoted attribute doesn't close the tag, either
+        quote character opens or closes a quote, and a stray '>' outside
+        a tag is dropped.
+    """
     logging.debug("Entered remove_html_tags")
-    tag = False
-    quote = False
-    cleaned_article = ""
-
-    for character in article_content:
-        if character == '<' and not quote:
-            tag = True
-        elif character == '>' and not quote:
-            tag = False
-        elif character in ('"', "'") and tag:
-            quote = not quote
-        elif not tag:
-            cleaned_article = cleaned_article + character
+    pieces = []
+    pos = 0
+    size = len(article_content)
+    pattern = _OUTSIDE_TAG
+
+    while pos < size:
+        match = pattern.search(article_content, pos)
+        if match is None:
+            if pattern is _OUTSIDE_TAG:
+                pieces.append(article_content[pos:])
+            break
+        character = match.group()
+        if pattern is _OUTSIDE_TAG:
+            pieces.append(article_content[pos:match.start()])
+            if character == '<':
+                pattern = _INSIDE_TAG
+        elif pattern is _INSIDE_TAG:
+            pattern = _OUTSIDE_TAG if character == '>' else _INSIDE_QUOTE
+        else:
+            pattern = _INSIDE_TAG
+        pos = match.end()
+
+    cleaned_article = "".join(pieces)
     logging.debug("Return value is: %s", cleaned_article)
     return cleaned_article
 
 
+def clean_articles(articles: list[dict]) -> list[dict]:
+    """ Strips the character count postscript and html tags from the
+        content of every article in a newsapi 'articles' list.
+        Articles are changed in place and the list is returned.
+    """
+    logging.debug("Entered clean_articles")
+    for article in articles:
+        content = article.get('content') or ""
+        # Checks for char count postscript and removes it
+        if "chars]" in content:
+            content = remove_html_tags(content[:content.index("[")])
+        article['content'] = content
+    return articles
+
+
 def news_API_request(
-        covid_terms: str = "Covid COVID-19 coronavirus") -> dict[str]:
+        covid_terms: str = "Covid COVID-19 coronavirus", page: int = 1,
+        domains: str = None, news_lang: str = None) -> dict[str]:
     """ Builds the URL to call the news API at newsapi.org, 
     sends the query and returns the retrieved json dictionary.
+    The URL is built by a NewsQueryBuilder, which only re-encodes it
+    when the config or query changes.
     The arguments for API can be set in the config.json file.
     If nothing is configured for the API, defaults will be used.
+    'domains' and 'news_lang' override the config values, and 'page'
+    picks which page of NEWS_PAGE_SIZE results is returned.
     """
     logging.debug("Entered news_API_request")
     logging.debug("covid_terms passed are: %s", covid_terms)
 
-    url = ""
-
-    # Adding URL stub
-    if config['news_api_url_stub']:
-        news_api_url_stub = config['news_api_url_stub']
-        logging.debug(
-            "Config loaded."
-            " Using '%s' as criteria for news_api_url_stub",
-            config['news_api_url_stub'])
-        url = url + news_api_url_stub
-    else:
-        news_api_url_stub = 'https://newsapi.org/v2/everything?'
-        logging.info(
-            "'news_api_url_stub' not set in config."
-            " Using default 'https://newsapi.org/v2/everything?' instead."
-            )
-        url = url + news_api_url_stub
-
-    # Adding keywords to url query
-    keywords = ' OR '.join(covid_terms.split())
-    url = url + f'qInTitle={keywords}&'
-    logging.info(
-        "Using '%s' as criteria for keywords", keywords
-        )
-
-    # Adding domains to url query
-    if config['domains']:
-        domains = config['domains']
-        logging.debug(
-            "Config loaded."
-            " Using '%s' as criteria for domains", config['domains']
-            )
-        url = url + f'domains={domains}&'
-
-    # Adding sort rule to url query
-    if config['sort']:
-        sort = config['sort']
-        logging.debug(
-            "Config loaded."
-            " Using '%s' as criteria for sort", config['sort']
-            )
-        url = url + f'sortBy={sort}&'
-    else:
-        sort = "relevancy"
-        logging.info(
-            "'sort' not set in config."
-            " Using default 'relevancy' instead."
-            )
-        url = url + f'sortBy={sort}&'
-
-    # Adding max_article_age to url query
-    if config['max_article_age']:
-        dt_now = datetime.datetime.now()
-        days_to_subtract = datetime.timedelta(
-            days=int(config['max_article_age'])
-            )
-
-        date = dt_now - days_to_subtract
-        date = str(date)[:10]
-
-        logging.debug(
-            "Config loaded."
-            " Using '%s' as criteria for max_article_age",
-            config['max_article_age']
-            )
-        url = url + f'from={date}&'
-    else:
-        date = datetime.datetime.now()
-        date = str(date)[:10]
-        logging.info(
-            "'max_article_age' not set in config."
-            " Using default '0' instead."
-            )
-        url = url + f'from={date}&'
-
-    # Adding news_lang to url query
-    if config['news_lang']:
-        news_lang = config['news_lang']
-        logging.debug(
-            "Config loaded."
-            " Using '%s' as criteria for news_lang", config['news_lang']
-            )
-        url = url + f'language={news_lang}&'
-    else:
-        news_lang = "en"
-        logging.info(
-            "'news_lang' not set in config."
-            " Using default 'en' instead."
-            )
-        url = url + f'language={news_lang}&'
-
-    # Adding news_API_key to url query
-    if config['news_API_key']:
-        news_API_key = config['news_API_key']
-        logging.debug(
-            "Config loaded."
-            " Found news_API_key."
-            )
-        url = url + f'apiKey={news_API_key}'
-    else:
-        logging.warning("'news_API_key' not set in config.")
-        news_API_key = None
+    url = _query_builder.url(
+        load_config.open_user_config(), covid_terms, page, domains,
+        news_lang, NEWS_PAGE_SIZE)
 
     # Finally, sending url query to news API
     logging.debug("Completed URL is : %s", url)
 
-    response = requests.get(url)
+    try:
+        response = http_client.http_get(url)
+    except requests.exceptions.RequestException:
+        logging.error(
+            "Request to the news API failed after retries.", exc_info=True)
+        logging.debug("Return value is: None")
+        return None
 
     try:
         logging.debug("Return value is: %s", )
@@ -165,11 +142,97 @@ def news_API_request(
         return None
 
 
+def news_query_sets() -> list[dict[str]]:
+    """ Returns the query sets update_news fetches. These come from the
+    optional 'news_query_sets' config entry, a list of objects with
+    'keywords', 'domains' and 'language' keys. Without it, a single
+    query set is made from 'news_keywords'.
+    """
+    config = load_config.open_user_config()
+    query_sets = config.get('news_query_sets') or [
+        {'keywords': config['news_keywords']}]
+    return [
+        {
+            'keywords': query_set.get('keywords') or config['news_keywords'],
+            'domains': query_set.get('domains'),
+            'language': query_set.get('language'),
+        }
+        for query_set in query_sets
+    ]
+
+
+def news_API_request_all(
+        query_sets: list[dict[str]],
+        max_pages: int = NEWS_MAX_PAGES) -> dict[str] | None:
+    """ Runs several news API queries at once, reading up to 'max_pages'
+    pages of each, and merges the results into one response.
+    The first page of every query set is requested straight away, and
+    further pages are requested as soon as the first page says how many
+    results there are. Articles are dropped if an earlier one had the
+    same URL or title.
+    Returns the first error response if no query set succeeded, or None
+    if none of them got an answer.
+    """
+    logging.debug("Entered news_API_request_all")
+    pages = {}
+    errors = []
+
+    with concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(len(query_sets) * max_pages, 1)) as executor:
+        futures = {}
+
+        def submit(index, page):
+            query_set = query_sets[index]
+            future = executor.submit(
+                news_API_request, query_set['keywords'], page,
+                query_set['domains'], query_set['language'])
+            futures[future] = (index, page)
+
+        for index in range(len(query_sets)):
+            submit(index, 1)
+        while futures:
+            done, _ = concurrent.futures.wait(
+                futures, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                index, page = futures.pop(future)
+                response = future.result()
+                if response is None:
+                    continue
+                if response.get('status') != 'ok':
+                    # Running past the results available is not an error
+                    if page == 1:
+                        errors.append(response)
+                    continue
+                pages[(index, page)] = response['articles']
+                if page == 1:
+                    available = -(-response.get('totalResults', 0)
+                                  // NEWS_PAGE_SIZE)
+                    for next_page in range(2, min(available, max_pages) + 1):
+                        submit(index, next_page)
+
+    if not pages:
+        logging.debug("No query set succeeded")
+        return errors[0] if errors else None
+
+    articles = []
+    seen = set()
+    for key in sorted(pages):
+        for article in pages[key]:
+            keys = {article.get('url'), article.get('title')} - {None}
+            if keys & seen:
+                continue
+            seen.update(keys)
+            articles.append(article)
+    logging.debug(
+        "Merged %s articles from %s pages", len(articles), len(pages))
+    return {'status': 'ok', 'totalResults': len(articles),
+            'articles': articles}
+
+
 def update_news(update_name: str) -> None:
     """ Updates the news_articles dictionary """
     logging.debug("Entered update_news")
-    article_cache = news_API_request(
-        config['news_keywords'])
+    article_cache = news_API_request_all(news_query_sets())
 
     # Check if URL query was successful
     if article_cache is None:
@@ -179,26 +242,45 @@ def update_news(update_name: str) -> None:
                 Check the URL in config.json and try again. To dismiss this \
                 message, please click on the 'X' button on the top right."
         }
-        news_articles.append(error_dict)
+        if news_articles.add(error_dict):
+            data_version.bump("news_articles")
     # Check if the API params are valid
     elif article_cache['status'] == 'ok':
-        article_cache = article_cache['articles']
-        existing_list = []
-        for article in news_articles:
-            existing_list.append(article['title'])
+        article_cache = clean_articles(article_cache['articles'])
+        changed = False
         for entry in article_cache:
-            # Checks for char count postscript and removes it
-            if "chars]" in entry['content']:
-                entry['content'] = remove_html_tags(
-                    entry['content'][:entry['content'].index("[")])
+            text = entry['title'] + " " + entry['content']
             # Adds postscript with hyperlink to article source
-            entry['content'] = entry['content'] + flask.Markup(
+            entry['content'] = entry['content'] + Markup(
                 "<a target=""blank"" rel=""noopener noreferrer"" href=\"" +
                 entry['url'] + "\"> (Read More)</a> ")
             entry['sched_update_event'] = update_name
-            if entry['title'] not in blacklist and \
-                    entry['title'] not in existing_list:
-                news_articles.append(entry)
+            if entry['title'] in blacklist:
+                continue
+            # Articles already held come back on every refresh, so skip
+            # them before paying for a near-duplicate lookup
+            if entry['title'] in news_articles or \
+                    news_articles.has_url(entry['url']):
+                continue
+            duplicate = near_duplicates.find(text)
+            if duplicate is not None:
+                logging.debug(
+                    "Skipping '%s' as a near copy of '%s'",
+                    entry['title'], duplicate)
+                continue
+            if news_articles.add(entry):
+                near_duplicates.add(entry['title'], text)
+                article_index.add(entry['title'], text)
+                changed = True
+        for article in news_articles.evict():
+            logging.debug("Evicting article: %s", article['title'])
+            near_duplicates.remove(article['title'])
+            article_index.remove(article['title'])
+            changed = True
+        blacklist.prune()
+        # Only invalidate the page when the stored articles changed
+        if changed:
+            data_version.bump("news_articles")
     # If API params are invalid: display the error message returned by the API
     elif article_cache['status'] == 'error':
         error_dict = {
@@ -206,7 +288,8 @@ def update_news(update_name: str) -> None:
             'content': f"{article_cache['message']} To dismiss this \
                 message, please click on the 'X' button on the top right."
         }
-        news_articles.append(error_dict)
+        if news_articles.add(error_dict):
+            data_version.bump("news_articles")
 
 
 def clear_newsapi_error_msgs() -> None:
@@ -214,48 +297,87 @@ def clear_newsapi_error_msgs() -> None:
     removes the dictionary entry from the 'news_article' list
     """
     logging.debug("Entered clear_newsapi_error_msgs")
-    for index in range(len(news_articles)-1, -1, -1):
-        if 'error' in news_articles[index]:
-            news_articles.pop(index)
+    for article in list(news_articles):
+        if 'error' in article:
+            discard_article(article['title'])
+
+
+def discard_article(title: str) -> dict[str] | None:
+    """ Removes an article from news_articles and from the indexes
+    built over it. Returns the removed article, or None if there wasn't
+    one with that title.
+    """
+    near_duplicates.remove(title)
+    article_index.remove(title)
+    article = news_articles.remove(title)
+    if article is not None:
+        data_version.bump("news_articles")
+    return article
+
+
+def search_articles(query: str, limit: int = None) -> list[dict[str]]:
+    """ Searches the stored articles' titles and content for the words
+    in 'query' and returns the matching articles, best match first.
+    """
+    logging.debug("Entered search_articles")
+    results = []
+    for title, _ in article_index.search(query):
+        article = news_articles.get(title)
+        if article is not None:
+            results.append(article)
+    return results if limit is None else results[:limit]
+
+
+def run_news_update(
+        update_name: str, on_complete=None, due: float = None) -> None:
+    """ Runs a scheduled news update, then tells 'on_complete' that
+    the update has finished, even if it failed. Other news updates due
+    in the same minute as 'due' share this run.
+    """
+    if due is None:
+        due = time.time()
+    jobs = [(update_name, on_complete, due)] + \
+        update_jobs.take_due_events(s, run_news_update, due)
+    try:
+        update_news(update_name)
+    finally:
+        for name, callback, _ in jobs:
+            if callback is not None:
+                callback(name)
 
 
 def schedule_news_updates(
-        update_interval: int, update_name: str) -> sched.Event:
-    """ Sets events tonthe news scheduler """
+        update_interval: int, update_name: str,
+        on_complete=None) -> sched.Event:
+    """ Sets events tonthe news scheduler. 'on_complete' is called with
+    update_name once the update has run.
+    """
     logging.debug("Entered schedule_news_updates")
     logging.debug("Scheduled update is called %s, update_inveral is %s", update_name, update_interval)
-    return s.enter(update_interval, 1, update_news, {update_name: update_name})
+    due = time.time() + update_interval
+    return s.enterabs(due, 1, run_news_update, (update_name, on_complete, due))
 
 
 def remove_article(notif: str) -> None:
     """ Removes news article from dashboard """
     logging.debug("Entered remove_article")
-    for article in news_articles:
-        if article['title'] == notif:
-            logging.debug(
-                "Removed and putting in blacklist article: \n%s",
-                article['title']
-                )
-            blacklist.append(article['title'])
-            news_articles.remove(article)
-    logging.debug("Article blacklist is currently: \n%s", blacklist)            
+    if discard_article(notif) is not None:
+        logging.debug(
+            "Removed and putting in blacklist article: \n%s", notif)
+        blacklist.add(notif)
+    logging.debug("Article blacklist holds %s titles", len(blacklist))
 
 
 def cancel_news_update(item: dict[str]) -> None:
     """ Cancels news update events """
     logging.debug("Entered cancel_news_update")
-    s.cancel(item['event'])
+    try:
+        s.cancel(item['event'])
+    except ValueError:
+        logging.debug("News event had already run")
     logging.debug("Cancelled news update is: %s", item)
 
 
-def run_scheduled_news_updates() -> None:
-    """ Runs scheduled news updates """
-    logging.debug("Entered run_scheduled_news_updates")
-    """ Run updates defined by schedule_news_updates """
-    logging.debug("Current news scheduler queue is: %s", str(s.queue))
-    s.run(blocking=False)
-
-
 if __name__ == '__main__':
     pass
     # print(type(schedule_news_updates(1, "Test")))
@@ -0,0 +1,116 @@
+from __future__ import annotations
+import datetime
+import logging
+import urllib.parse
+
+DEFAULT_NEWS_API_URL = 'https://newsapi.org/v2/everything?'
+DEFAULT_SORT = 'relevancy'
+DEFAULT_LANGUAGE = 'en'
+
+# Config entries the news API URL is built from
+_URL_CONFIG_KEYS = (
+    'news_api_url_stub', 'domains', 'sort', 'max_article_age',
+    'news_lang', 'news_API_key',
+)
+
+
+class NewsQueryBuilder:
+    """ Builds news API request URLs. Everything except the 'from=' date
+        and the page number is encoded once per combination of config
+        values and query arguments, and rebuilt automatically when the
+        config changes.
+    """
+
+    def __init__(self) -> None:
+        self._config_values = None
+        self._templates = {}
+        self._max_article_age = 0
+
+    def _check_config(self, config: dict) -> None:
+        """ Drops the compiled URLs if the config they came from has
+            changed since they were built.
+        """
+        config_values = tuple(config.get(key) for key in _URL_CONFIG_KEYS)
+        if config_values == self._config_values:
+            return
+        logging.debug("News API config changed, rebuilding query URLs")
+        self._config_values = config_values
+        self._templates = {}
+        self._max_article_age = int(config.get('max_article_age') or 0)
+        if not config.get('news_api_url_stub'):
+            logging.info(
+                "'news_api_url_stub' not set in config."
+                " Using default '%s' instead.", DEFAULT_NEWS_API_URL)
+        if not config.get('sort'):
+            logging.info(
+                "'sort' not set in config."
+                " Using default '%s' instead.", DEFAULT_SORT)
+        if not config.get('max_article_age'):
+            logging.info(
+                "'max_article_age' not set in config."
+                " Using default '0' instead.")
+        if not config.get('news_lang'):
+            logging.info(
+                "'news_lang' not set in config."
+                " Using default '%s' instead.", DEFAULT_LANGUAGE)
+        if not config.get('news_API_key'):
+            logging.warning("'news_API_key' not set in config.")
+
+    def _compile(
+            self, config: dict, covid_terms: str, domains: str | None,
+            news_lang: str | None, page_size: int) -> str:
+        """ Encodes every part of the URL that doesn't depend on the date
+            or page, ending just before the 'from=' value.
+        """
+        stub = config.get('news_api_url_stub') or DEFAULT_NEWS_API_URL
+        if not stub.endswith(('?', '&')):
+            stub += '&' if '?' in stub else '?'
+        if domains is None:
+            domains = config.get('domains')
+        if news_lang is None:
+            news_lang = config.get('news_lang')
+
+        params = [('qInTitle', ' OR '.join(covid_terms.split()))]
+        if domains:
+            params.append(('domains', domains))
+        params.append(('sortBy', config.get('sort') or DEFAULT_SORT))
+        params.append(('language', news_lang or DEFAULT_LANGUAGE))
+        params.append(('pageSize', page_size))
+        if config.get('news_API_key'):
+            params.append(('apiKey', config['news_API_key']))
+        logging.debug("Compiled news API query for '%s'", covid_terms)
+        return stub + urllib.parse.urlencode(
+            params, quote_via=urllib.parse.quote) + '&from='
+
+    def url(
+            self, config: dict, covid_terms: str, page: int = 1,
+            domains: str = None, news_lang: str = None,
+            page_size: int = 20) -> str:
+        """ Returns the URL for one news API request.
+
+        :param config: The user config to build the URL from
+        :type config: dict
+        :param covid_terms: Space separated keywords, any of which must
+            be in an article's title
+        :type covid_terms: str
+        :param page: Page of results to ask for
+        :type page: int
+        :param domains: Domains to search, overriding the config
+        :type domains: str
+        :param news_lang: Language to search, overriding the config
+        :type news_lang: str
+        :param page_size: Number of articles per page
+        :type page_size: int
+        :return: Returns the request URL
+        :rtype: str
+        """
+        self._check_config(config)
+        key = (covid_terms, domains, news_lang, page_size)
+        template = self._templates.get(key)
+        if template is None:
+            template = self._compile(
+                config, covid_terms, domains, news_lang, page_size)
+            self._templates[key] = template
+        date = datetime.date.today() - datetime.timedelta(
+            days=self._max_article_age)
+        return f'{template}{date.isoformat()}&page={page}'
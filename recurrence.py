@@ -0,0 +1,183 @@
+from __future__ import annotations
+import datetime
+import re
+
+# Furthest ahead a cron expression is searched for its next fire time.
+# Covers expressions like '0 0 29 2 *' that only match in leap years.
+MAX_SEARCH_DAYS = 366 * 8
+
+_DAILY = re.compile(r"^(\d{1,2}):(\d{2})$")
+_INTERVAL = re.compile(r"^every\s+(\d+)\s*([smhd])$", re.IGNORECASE)
+_UNIT_SECONDS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+_MONTHS = ('jan', 'feb', 'mar', 'apr', 'may', 'jun',
+           'jul', 'aug', 'sep', 'oct', 'nov', 'dec')
+_WEEKDAYS = ('sun', 'mon', 'tue', 'wed', 'thu', 'fri', 'sat')
+
+
+def _parse_field(
+        field: str, low: int, high: int, names: tuple = ()) -> frozenset:
+    """ Expands one cron field, such as '*/15', '1-5' or 'mon,wed', into
+        the set of values it matches.
+
+    :raises ValueError: If the field isn't valid
+    """
+    values = set()
+    for part in field.lower().split(','):
+        range_part, _, step = part.partition('/')
+        step = int(step) if step else 1
+        if step < 1:
+            raise ValueError(f"Invalid step in cron field: {field}")
+        if range_part == '*':
+            start, end = low, high
+        else:
+            start, _, end = range_part.partition('-')
+            start = _cron_value(start, low, names)
+            end = _cron_value(end, low, names) if end else \
+                (high if step > 1 else start)
+        if not low <= start <= end <= high:
+            raise ValueError(f"Cron field out of range: {field}")
+        values.update(range(start, end + 1, step))
+    return frozenset(values)
+
+
+def _cron_value(value: str, low: int, names: tuple) -> int:
+    """ Turns a cron value, which may be a month or day name, into a number """
+    if value in names:
+        return names.index(value) + low
+    return int(value)
+
+
+class CronRecurrence:
+    """ Fires at the wall clock times matched by a five field cron
+        expression: minute, hour, day of month, month and day of week.
+        Fire times are worked out in 'timezone', or the server's local
+        time if it is None, so they stay on the same wall clock time
+        across daylight saving changes. A time skipped by the clocks
+        going forward fires at the moment they change, and a time that
+        happens twice when they go back fires only once, the first
+        time round.
+    """
+
+    def __init__(self, expression: str, timezone=None) -> None:
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(
+                f"Cron expression needs 5 fields: {expression}")
+        self.expression = expression
+        self.timezone = timezone
+        self.minutes = sorted(_parse_field(fields[0], 0, 59))
+        self.hours = sorted(_parse_field(fields[1], 0, 23))
+        self.days = _parse_field(fields[2], 1, 31)
+        self.months = _parse_field(fields[3], 1, 12, _MONTHS)
+        # Sunday can be given as 0 or 7
+        self.weekdays = frozenset(
+            day % 7 for day in _parse_field(fields[4], 0, 7, _WEEKDAYS))
+        # As in cron, when both day fields are restricted either may match
+        self._any_day = fields[2] == '*' or fields[4] == '*'
+
+    def _matches_day(self, day: datetime.date) -> bool:
+        if day.month not in self.months:
+            return False
+        day_match = day.day in self.days
+        weekday_match = (day.weekday() + 1) % 7 in self.weekdays
+        if self._any_day:
+            return day_match and weekday_match
+        return day_match or weekday_match
+
+    def next_fire(self, after: float) -> float:
+        """ Works out when the recurrence next fires.
+
+        :param after: Unix time to look after
+        :type after: float
+        :return: Returns the Unix time of the first fire strictly after
+            'after'
+        :rtype: float
+        :raises ValueError: If the expression never matches a date
+        """
+        start = datetime.datetime.fromtimestamp(after, self.timezone)
+        day = start.date()
+        for _ in range(MAX_SEARCH_DAYS):
+            if self._matches_day(day):
+                for hour in self.hours:
+                    if day == start.date() and hour < start.hour:
+                        continue
+                    for minute in self.minutes:
+                        moment = self._timestamp(datetime.datetime(
+                            day.year, day.month, day.day, hour, minute,
+                            tzinfo=self.timezone))
+                        if moment > after:
+                            return moment
+            day += datetime.timedelta(days=1)
+        raise ValueError(
+            f"Cron expression never fires: {self.expression}")
+
+    def _wall_time(self, moment: float) -> datetime.datetime:
+        return datetime.datetime.fromtimestamp(
+            moment, self.timezone).replace(tzinfo=None)
+
+    def _timestamp(self, wall: datetime.datetime) -> float:
+        """ Returns the Unix time the clocks show 'wall', or for a wall
+            time skipped when the clocks go forward, the moment they change.
+        """
+        moment = wall.timestamp()
+        naive = wall.replace(tzinfo=None)
+        if self._wall_time(moment) == naive:
+            return moment
+        # 'wall' falls in a gap, which its two folds straddle. The
+        # change is the first second the clocks show 'wall' or later.
+        before, after = sorted(
+            (int(wall.replace(fold=1).timestamp()), int(moment)))
+        while after - before > 1:
+            middle = (before + after) // 2
+            if self._wall_time(middle) < naive:
+                before = middle
+            else:
+                after = middle
+        return float(after)
+
+    def __str__(self) -> str:
+        return self.expression
+
+
+class IntervalRecurrence:
+    """ Fires every 'seconds' seconds, however the clocks change """
+
+    def __init__(self, seconds: int) -> None:
+        if seconds < 1:
+            raise ValueError("Interval must be at least one second")
+        self.seconds = seconds
+
+    def next_fire(self, after: float) -> float:
+        """ Returns the Unix time one interval after 'after' """
+        return after + self.seconds
+
+    def __str__(self) -> str:
+        return f"every {self.seconds}s"
+
+
+def parse_recurrence(spec: str, timezone=None):
+    """ Builds a recurrence from what a user typed in. Accepts a time of
+        day as 'HH:MM' (daily at that time), an interval such as
+        'every 30m' or 'every 2h', or a five field cron expression.
+
+    :param spec: Recurrence to parse
+    :type spec: str
+    :param timezone: Time zone for wall clock times, or None for the
+        server's local time
+    :type timezone: zoneinfo.ZoneInfo
+    :return: Returns an object with a 'next_fire(after)' method
+    :rtype: CronRecurrence or IntervalRecurrence
+    :raises ValueError: If the recurrence isn't valid
+    """
+    spec = spec.strip()
+    daily = _DAILY.match(spec)
+    if daily:
+        hour, minute = int(daily.group(1)), int(daily.group(2))
+        if hour > 23 or minute > 59:
+            raise ValueError(f"Invalid time of day: {spec}")
+        return CronRecurrence(f"{minute} {hour} * * *", timezone)
+    interval = _INTERVAL.match(spec)
+    if interval:
+        return IntervalRecurrence(
+            int(interval.group(1)) * _UNIT_SECONDS[interval.group(2).lower()])
+    return CronRecurrence(spec, timezone)
@@ -0,0 +1,21 @@
+// Keeps the dashboard up to date without reloading the page. The server
+// pushes the parts of the page that have changed over '/events' and they
+// are swapped in here. Browsers without EventSource reload every minute.
+(function () {
+    if (!window.EventSource) {
+        setTimeout(function () { window.location = '/index'; }, 60000);
+        return;
+    }
+    var version = document.body.getAttribute('data-version');
+    var source = new EventSource('/events?version=' + encodeURIComponent(version));
+    source.addEventListener('fragment', function (event) {
+        var fragment = JSON.parse(event.data);
+        var element = document.getElementById(fragment.id);
+        if (!element) {
+            // e.g. search results are shown in place of the latest news
+            return;
+        }
+        element.innerHTML = fragment.html;
+        $(element).find('.toast').toast('show');
+    });
+})();
@@ -0,0 +1,12 @@
+from article_search import ArticleIndex
+
+
+def test_article_index():
+    index = ArticleIndex()
+    index.add('a', 'Vaccine booster rollout speeds up in Devon')
+    index.add('b', 'Hospital cases fall as vaccine uptake rises')
+    index.add('c', 'School holidays extended')
+    assert [key for key, _ in index.search('booster vaccine')] == ['a', 'b']
+    index.remove('a')
+    assert [key for key, _ in index.search('booster vaccine')] == ['b']
+    assert index.search('') == []
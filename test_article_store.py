@@ -0,0 +1,90 @@
+import datetime
+import threading
+from article_store import ArticleStore, TitleBlacklist
+
+
+def test_article_store():
+    store = ArticleStore()
+    assert store.add({'title': 'One', 'url': 'https://a'})
+    assert store.add({'title': 'Two', 'url': 'https://b'})
+    assert store.add({'title': 'Three'})
+    assert not store.add({'title': 'One', 'url': 'https://c'})
+    assert not store.add({'title': 'Copy of two', 'url': 'https://b'})
+    assert [article['title'] for article in store[:2]] == ['One', 'Two']
+    assert store[-1]['title'] == 'Three'
+    assert store.remove('Two')['url'] == 'https://b'
+    assert not store.has_url('https://b')
+    assert 'Two' not in store and len(store) == 2
+
+
+def test_article_store_eviction():
+    store = ArticleStore(max_count=2, max_age=60 * 60)
+    store.add({'title': 'Old', 'publishedAt': '2021-10-27T10:00:00Z'})
+    store.add({'title': 'A', 'publishedAt': '2021-10-28T10:00:00Z'})
+    store.add({'title': 'B', 'publishedAt': '2021-10-28T10:30:00Z'})
+    store.add({'title': 'Error: no date'})
+    store.touch('A')
+    now = datetime.datetime(
+        2021, 10, 28, 11, tzinfo=datetime.timezone.utc).timestamp()
+    evicted = [article['title'] for article in store.evict(now)]
+    assert evicted == ['Old', 'B']
+    assert [article['title'] for article in store] == ['A', 'Error: no date']
+
+
+def test_article_store_threads():
+    store = ArticleStore(max_count=50)
+    errors = []
+
+    def write():
+        try:
+            for number in range(5_000):
+                store.add({'title': f"Story {number}"})
+                store.evict()
+        except RuntimeError as error:
+            errors.append(error)
+
+    def read():
+        try:
+            for _ in range(5_000):
+                for article in store[:5]:
+                    store.touch(article['title'])
+                list(store)
+        except RuntimeError as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=write), threading.Thread(target=read)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert len(store) == 50
+
+
+def test_title_blacklist():
+    blacklist = TitleBlacklist(max_count=2, max_age=100)
+    blacklist.add('One', now=0)
+    blacklist.add('Two', now=50)
+    assert 'One' in blacklist and 'Three' not in blacklist
+    blacklist.add('Three', now=60)
+    assert 'One' not in blacklist and len(blacklist) == 2
+    blacklist.prune(now=155)
+    assert 'Two' not in blacklist and 'Three' in blacklist
+
+
+def test_title_blacklist_threads():
+    blacklist = TitleBlacklist(max_count=50, max_age=1_000)
+
+    def churn(prefix):
+        for number in range(2_000):
+            blacklist.add(f"{prefix} {number}", now=number)
+            blacklist.prune(now=number)
+
+    threads = [
+        threading.Thread(target=churn, args=(prefix,))
+        for prefix in ('a', 'b', 'c')]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(blacklist) == 50
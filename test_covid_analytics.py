@@ -0,0 +1,18 @@
+import covid_analytics
+from covid_data_handler import parse_csv_data
+from covid_data_handler import process_covid_csv_data
+from covid_series import CovidSeries
+
+
+def test_covid_trends():
+    series = CovidSeries.from_csv(
+        '\n'.join(parse_csv_data('nation_2021-10-28.csv')))
+    process_csv = process_covid_csv_data(
+        parse_csv_data('nation_2021-10-28.csv'))
+    assert covid_analytics.rolling_sums(series)[0] == process_csv[0]
+    assert covid_analytics.rolling_sums(series, 1)[:2] == [30_405, 37_505]
+    trends = covid_analytics.covid_trends(series, population=56_550_138)
+    assert trends['rolling_sum'] == 240_299
+    assert round(trends['rate_per_100k'], 1) == 424.9
+    previous = covid_analytics.rolling_sums(series)[7]
+    assert trends['growth'] == (240_299 - previous) / previous * 100
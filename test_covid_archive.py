@@ -0,0 +1,32 @@
+import pytest
+from covid_archive import CovidArchive
+
+
+def test_covid_archive(tmp_path):
+    with open('nation_2021-10-28.csv', 'r', encoding='utf-8') as file:
+        lines = file.read().splitlines()
+    (tmp_path / 'nation_2021-10-28.csv').write_text('\n'.join(lines))
+    # An older snapshot that is one day behind
+    (tmp_path / 'nation_2021-10-27.csv').write_text(
+        '\n'.join(lines[:1] + lines[2:]))
+    with CovidArchive(str(tmp_path)) as archive:
+        assert len(archive.snapshot_dates()) == 2
+        assert archive.get('hospitalCases', 'England', '2021-10-28') == 7_019
+        assert archive.get(
+            'newCasesBySpecimenDate', 'England', '2021-10-28') is None
+        assert archive.get(
+            'hospitalCases', 'England', '2021-10-27', '2021-10-27') == 6_951
+        with pytest.raises(KeyError):
+            archive.get('hospitalCases', 'England', '2021-10-28', '2021-10-27')
+
+
+def test_covid_archive_skips_empty_and_truncated_files(tmp_path):
+    with open('nation_2021-10-28.csv', 'r', encoding='utf-8') as file:
+        lines = file.read().splitlines()
+    (tmp_path / 'nation_2021-10-28.csv').write_text('\n'.join(lines))
+    (tmp_path / 'nation_2021-10-29.csv').write_text('')
+    (tmp_path / 'nation_2021-10-30.csv').write_text('areaCode,areaNa')
+    with CovidArchive(str(tmp_path)) as archive:
+        assert archive.get('hospitalCases', 'England', '2021-10-28') == 7_019
+        with pytest.raises(KeyError):
+            archive.get('hospitalCases', 'England', '2021-10-28', '2021-10-29')
@@ -1,11 +1,17 @@
 import sched
 import time
+import covid_data_handler
+import load_config
 from covid_data_handler import parse_csv_data
+from covid_data_handler import stream_csv_data
 from covid_data_handler import process_covid_csv_data
 from covid_data_handler import covid_API_request
 from covid_data_handler import schedule_covid_updates
 from covid_data_handler import process_covid_json_data
 from covid_data_handler import cancel_covid_update
+from covid_data_handler import covid_API_request_many
+from covid_data_handler import compute_covid_metrics
+from covid_series import METRICS, CovidSeries
 
 def test_parse_csv_data():
     data = parse_csv_data('nation_2021-10-28.csv')
@@ -25,7 +31,7 @@ def test_process_covid_csv_data():
 
 def test_covid_API_request():
     data = covid_API_request()
-    assert isinstance(data, dict)
+    assert isinstance(data, CovidSeries)
 
 
 def test_schedule_covid_updates():
@@ -33,6 +39,7 @@ def test_schedule_covid_updates():
         update_interval=20, update_name='update test'
         )
     assert isinstance(test_event, sched.Event)
+    covid_data_handler.s.cancel(test_event)
 
 
 def test_process_covid_json_data():
@@ -49,3 +56,134 @@ def test_cancel_covid_update():
     print(len(test_scheduler.queue))
     cancel_covid_update(event_dict)
     assert (len(test_scheduler.queue)) == 0
+
+
+def test_covid_API_request_many(monkeypatch):
+    def fake_request(location, location_type):
+        if location == 'Slow':
+            time.sleep(2)
+        time.sleep(0.2)
+        return {'areaName': location}
+    monkeypatch.setattr(covid_data_handler, 'covid_API_request', fake_request)
+    start = time.monotonic()
+    data = covid_API_request_many(
+        [('Exeter', 'ltla'), ('England', 'nation'), ('Slow', 'ltla')],
+        timeout=0.5)
+    assert time.monotonic() - start < 1
+    assert data == {
+        ('Exeter', 'ltla'): {'areaName': 'Exeter'},
+        ('England', 'nation'): {'areaName': 'England'},
+    }
+
+
+def test_compute_covid_metrics():
+    rows = [("", "", "5")] + [("", str(day), "10") for day in range(8)]
+    rows[3] = ("99", "3", "10")
+    assert compute_covid_metrics(rows) == (99, 0, 70)
+
+
+def test_process_covid_csv_data_streaming():
+    lines = stream_csv_data('nation_2021-10-28.csv')
+    assert process_covid_csv_data(lines) == (240_299, 7_019, 141_544)
+    # Only the rows up to the first reported death need to be read
+    assert len(list(lines)) < 638
+    with open('nation_2021-10-28.csv', 'r', encoding='utf-8') as file:
+        payload = file.read()
+    assert process_covid_csv_data(payload) == (240_299, 7_019, 141_544)
+
+
+def test_covid_API_request_cache(monkeypatch):
+    calls = []
+
+    class FakeCov19API:
+        last_update = '2021-10-28T15:00:00.000000Z'
+
+        def __init__(self, filters, structure):
+            self.filters = filters
+
+        def get_csv(self):
+            calls.append(self.filters)
+            with open('nation_2021-10-28.csv', 'r', encoding='utf-8') as file:
+                return file.read()
+
+    monkeypatch.setattr(covid_data_handler.uk_covid19, 'Cov19API', FakeCov19API)
+    covid_data_handler.clear_covid_cache()
+    first = covid_API_request('England', 'nation')
+    assert covid_API_request('England', 'nation') is first
+    monkeypatch.setattr(covid_data_handler, 'COVID_CACHE_TTL', 0)
+    assert covid_API_request('England', 'nation') is first
+    revision = first.revision
+    FakeCov19API.last_update = '2021-10-29T15:00:00.000000Z'
+    # Downloaded again, but the figures are the same so nothing changes
+    assert covid_API_request('England', 'nation') is first
+    assert first.revision == revision
+    assert len(calls) == 2
+    assert covid_data_handler.cache_stats == {
+        'hits': 1, 'misses': 2, 'revalidated': 1}
+    covid_data_handler.clear_covid_cache()
+
+
+def test_saved_stats_for_other_areas_are_not_restored(monkeypatch):
+    config = load_config.get_config()
+    local_area = (config.covid_minor, config.covid_minor_id)
+    monkeypatch.setattr(covid_data_handler.covid_store, 'load_covid_state',
+                        lambda: ({}, {
+                            'local_7day_infections': (local_area, 4_321),
+                            'local_7day_growth': (('Leeds', 'ltla'), '+9%'),
+                        }))
+    monkeypatch.setattr(covid_data_handler, '_stat_areas', {})
+    monkeypatch.setitem(covid_data_handler.covid_stats, 'local_7day_growth', '?')
+    monkeypatch.setitem(
+        covid_data_handler.covid_stats, 'local_7day_infections', '?')
+    covid_data_handler.load_saved_covid_state()
+    assert covid_data_handler.covid_stats['local_7day_infections'] == 4_321
+    assert covid_data_handler.covid_stats['local_7day_growth'] == '?'
+
+
+def test_overlapping_covid_updates_share_one_run(monkeypatch):
+    runs = []
+    finished = []
+    monkeypatch.setattr(covid_data_handler, 'update_covid_stats', runs.append)
+    # Start of a minute, on a clock the test controls
+    start = 60 * 30_000_000
+    clock = [start + 5]
+    test_scheduler = sched.scheduler(lambda: clock[0], lambda delay: None)
+    monkeypatch.setattr(covid_data_handler, 's', test_scheduler)
+    for name, offset in (('first', 5), ('second', 30), ('third', 59),
+                         ('next minute', 62), ('later', 3600)):
+        test_scheduler.enterabs(
+            start + offset, 1, covid_data_handler.run_covid_update,
+            (name, finished.append, start + offset))
+    test_scheduler.run(blocking=False)
+    assert runs == ['first']
+    assert finished == ['first', 'second', 'third']
+    # An update due in the next minute isn't run early
+    assert [event.argument[0] for event in test_scheduler.queue] == [
+        'next minute', 'later']
+
+
+def test_merge_covid_history():
+    header = 'areaCode,areaName,areaType,date,' + ','.join(METRICS)
+
+    def history(*days):
+        return CovidSeries.from_csv(header + ''.join(
+            f"\nE92000001,England,nation,{day},1,2,{cases}"
+            for day, cases in days))
+
+    series = history(('2021-10-27', 40), ('2021-10-26', 30), ('2021-10-25', 20))
+    revision = series.revision
+    same = history(('2021-10-27', 40), ('2021-10-26', 30), ('2021-10-25', 20))
+    assert covid_data_handler.merge_covid_history(series, same) is series
+    assert series.revision == revision
+    # A new day plus a revision to a day well inside the 7-day window
+    newer = history(('2021-10-28', 50), ('2021-10-27', 40),
+                    ('2021-10-26', 30), ('2021-10-25', 25))
+    assert covid_data_handler.merge_covid_history(series, newer) is series
+    assert series.revision != revision
+    assert list(series.rows()) == list(newer.rows())
+    assert list(series.dates) == list(newer.dates)
+    # A day filled in the middle of the history replaces the series
+    filled = history(('2021-10-28', 50), ('2021-10-27', 40), ('2021-10-26', 5))
+    merged = covid_data_handler.merge_covid_history(
+        history(('2021-10-28', 50), ('2021-10-26', 5)), filled)
+    assert merged is filled
@@ -0,0 +1,33 @@
+from covid_data_handler import parse_csv_data
+from covid_data_handler import process_covid_json_data
+from covid_series import CovidSeries
+
+
+def test_covid_series_from_csv():
+    with open('nation_2021-10-28.csv', 'rb') as file:
+        series = CovidSeries.from_csv(file.read())
+    assert len(series) == 638
+    assert series.area_name == 'England'
+    assert series.date(0).isoformat() == '2021-10-28'
+    assert series.value('newCasesBySpecimenDate', 0) is None
+    assert series.value('hospitalCases', 0) == 7_019
+    assert process_covid_json_data(series) == (141_544, 7_019, 240_299)
+    assert process_covid_json_data(series.to_dict()) == \
+        process_covid_json_data(series)
+
+
+def test_covid_series_merge():
+    lines = parse_csv_data('nation_2021-10-28.csv')
+    series = CovidSeries.from_csv('\n'.join(lines[:1] + lines[3:]))
+    recent = CovidSeries.from_csv('\n'.join(lines[:4]).replace(
+        '6883,30405', '6883,30500'))
+    revision = series.revision
+    assert series.merge(recent) == 3
+    assert series.revision > revision
+    revision = series.revision
+    assert series.to_dict() == CovidSeries.from_csv(
+        '\n'.join(lines).replace('6883,30405', '6883,30500')).to_dict()
+    assert series.merge(recent) == 0
+    assert series.revision == revision
+    # Revisions are never shared between series
+    assert CovidSeries().revision > revision
@@ -0,0 +1,18 @@
+import covid_store
+from covid_data_handler import parse_csv_data
+from covid_series import CovidSeries
+
+
+def test_covid_store_round_trip(tmp_path):
+    path = str(tmp_path / 'covid_cache.sqlite3')
+    series = CovidSeries.from_csv(
+        '\n'.join(parse_csv_data('nation_2021-10-28.csv')))
+    cache_key = (('areaType=nation',), (('date', 'date'),))
+    stats = {'local_7day_infections': (('Exeter', 'ltla'), 1_234)}
+    covid_store.save_covid_state(
+        {cache_key: {'series': series, 'last_update': 'then'}}, stats, path)
+    entries, loaded_stats = covid_store.load_covid_state(path)
+    assert loaded_stats == stats
+    loaded, last_update = entries[cache_key]
+    assert last_update == 'then'
+    assert loaded.to_dict() == series.to_dict()
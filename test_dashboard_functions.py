@@ -1,10 +1,174 @@
+import datetime
+import itertools
+import time
+import pytest
+import covid_data_handler
+import dashboard_functions
+import main
+import news_data_handling
+import data_version
 from dashboard_functions import calc_interval, create_app, render_index_page
+from update_journal import UpdateJournal
 
 events = []
 updates = []
 
 
+@pytest.fixture(autouse=True)
+def update_journal(tmp_path, monkeypatch):
+    """ Keeps the tests' scheduled updates out of the real journal """
+    journal = UpdateJournal(str(tmp_path / 'updates_journal.jsonl'))
+    monkeypatch.setattr(dashboard_functions, 'journal', journal)
+    yield journal
+    journal.close()
+
+
 def test_create_app():
     app = create_app
     print(type(app))
 
+
+
+def test_search_route():
+    news_data_handling.news_articles.add(
+        {'title': 'Booster jabs open to over 40s', 'content': 'Booster'})
+    news_data_handling.article_index.add(
+        'Booster jabs open to over 40s', 'Booster jabs open to over 40s')
+    client = main.app.test_client()
+    page = client.get('/search?q=booster').get_data(as_text=True)
+    assert 'Booster jabs open to over 40s' in page
+    assert 'Results for "booster"' in page
+    news_data_handling.discard_article('Booster jabs open to over 40s')
+
+
+def test_index_page_cache(monkeypatch):
+    client = main.app.test_client()
+    first = client.get('/index')
+    assert first.status_code == 200 and first.headers['ETag']
+    assert client.get('/index').headers['ETag'] == first.headers['ETag']
+    cached = client.get(
+        '/index', headers={'If-None-Match': first.headers['ETag']})
+    assert cached.status_code == 304
+    monkeypatch.setitem(
+        covid_data_handler.covid_stats, 'local_7day_infections', 12_345)
+    data_version.bump('test')
+    changed = client.get(
+        '/index', headers={'If-None-Match': first.headers['ETag']})
+    assert changed.status_code == 200
+    assert '12345' in changed.get_data(as_text=True)
+    with main.app.test_request_context('/index'):
+        page, etag = render_index_page()
+    assert changed.get_data(as_text=True) == page
+    assert changed.headers['ETag'] == f'"{etag}"'
+
+
+def test_finished_updates_leave_the_registry():
+    app = create_app()
+    with app.test_request_context():
+        dashboard_functions.serve_toast_news('00:00', 'news', 'once', None)
+        dashboard_functions.serve_toast_news('00:00', 'news', 'daily', '1')
+    once = dashboard_functions.updates.get('once news update')
+    daily = dashboard_functions.updates.get('daily news update (repeat daily)')
+    assert once and daily
+    assert dashboard_functions.NO_UPDATES_TITLE not in dashboard_functions.updates
+    first_event = daily['event']
+    dashboard_functions.update_finished(once)
+    dashboard_functions.update_finished(daily)
+    assert 'once news update' not in dashboard_functions.updates
+    assert daily['event'] is not first_event
+    assert daily['event'] in news_data_handling.s.queue
+    dashboard_functions.digest_toast(None, daily['title'])
+    assert daily['title'] not in dashboard_functions.updates
+    assert daily['event'] not in news_data_handling.s.queue
+    news_data_handling.cancel_news_update(once)
+
+
+def test_restore_updates(update_journal):
+    update_journal.schedule({'title': 'restored news update',
+                             'time': '07:30', 'type': 'news', 'repeat': 1,
+                             'content': 'Scheduler set to update news at: 07:30'})
+    assert dashboard_functions.restore_updates() == 1
+    item = dashboard_functions.updates.get('restored news update')
+    assert item['event'] in news_data_handling.s.queue
+    assert item['event'].time - time.time() == pytest.approx(
+        calc_interval('07:30'), abs=5)
+    dashboard_functions.digest_toast(None, 'restored news update')
+    assert update_journal.replay() == []
+
+
+def test_calc_interval_past_time():
+    now = datetime.datetime.now()
+    earlier = now - datetime.timedelta(hours=1)
+    expected = 23 * 60 * 60 - now.minute * 60 - now.second + \
+        earlier.minute * 60
+    assert calc_interval(earlier.strftime('%H:%M')) == pytest.approx(
+        expected, abs=2)
+
+
+def test_update_with_recurrence_repeats():
+    app = create_app()
+    with app.test_request_context():
+        dashboard_functions.serve_toast_covid_data(
+            None, 'covid-data', 'cron', None, None, '*/5 * * * *')
+    item = dashboard_functions.updates.get(
+        'cron covid data update (repeat */5 * * * *)')
+    assert item['repeat'] == 1
+    assert 0 < item['event'].time - time.time() <= 5 * 60
+    first_event = item['event']
+    dashboard_functions.update_finished(item)
+    assert item['event'] is not first_event
+    dashboard_functions.digest_toast(None, item['title'])
+    assert item['event'] not in covid_data_handler.s.queue
+
+
+def test_event_stream_pushes_changed_fragments(monkeypatch):
+    monkeypatch.setattr(dashboard_functions, 'SSE_KEEPALIVE_SECONDS', 0.05)
+    app = create_app()
+    with app.test_request_context():
+        version, _ = dashboard_functions.render_fragments()
+        stream = dashboard_functions.event_stream(version)
+        assert next(stream).startswith('retry:')
+        # The page is current, so only a keepalive until the data changes
+        assert next(stream) == ': keepalive\n\n'
+        monkeypatch.setitem(
+            covid_data_handler.covid_stats, 'hospital_cases', 'Pushed cases')
+        version = data_version.bump('test')
+        message = next(stream)
+        assert message.startswith(f'id: {version}\nevent: fragment\n')
+        assert '"id": "covid-stats"' in message
+        assert 'Pushed cases' in message
+        assert next(stream) == ': keepalive\n\n'
+        stream.close()
+        stale = list(itertools.islice(
+            dashboard_functions.event_stream(None), 4))
+    assert [
+        element_id for element_id in dashboard_functions.FRAGMENT_TEMPLATES
+        if any(f'"id": "{element_id}"' in message for message in stale)
+    ] == list(dashboard_functions.FRAGMENT_TEMPLATES)
+
+
+def test_events_route():
+    client = main.app.test_client()
+    response = client.get('/events', buffered=False)
+    assert response.mimetype == 'text/event-stream'
+    response.close()
+
+
+def test_invalid_recurrence_shows_error():
+    client = main.app.test_client()
+    response = client.get(
+        '/index?recurrence=bogus&two=Bad+schedule&covid-data=covid-data')
+    assert response.status_code == 200
+    assert '400 Error - Invalid repeat schedule' in \
+        response.get_data(as_text=True)
+    assert 'Bad schedule' not in dashboard_functions.updates
+    dashboard_functions.updates.remove('400 Error - Invalid repeat schedule')
+
+
+def test_recurrence_without_checkbox_shows_error():
+    client = main.app.test_client()
+    response = client.get('/index?recurrence=every+2h&two=Nothing+picked')
+    assert response.status_code == 200
+    assert '449 Error - Insufficient input' in \
+        response.get_data(as_text=True)
+    dashboard_functions.updates.remove('449 Error - Insufficient input')
@@ -0,0 +1,11 @@
+import threading
+import data_version
+
+
+def test_wait_for_change():
+    version = data_version.current()
+    assert data_version.wait_for_change(version, 0.01) == version
+    timer = threading.Timer(0.05, data_version.bump, ('test',))
+    timer.start()
+    assert data_version.wait_for_change(version, 5) > version
+    timer.join()
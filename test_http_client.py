@@ -0,0 +1,63 @@
+import http.server
+import threading
+import pytest
+import requests
+import http_client
+
+
+class FlakyHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    statuses = []
+
+    def do_GET(self):
+        status = self.statuses.pop(0) if self.statuses else 200
+        if self.path == '/slow':
+            threading.Event().wait(1)
+        body = b'{"status": "ok"}'
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(http_client, 'NEWS_BACKOFF_FACTOR', 0.01)
+    monkeypatch.setattr(http_client, 'NEWS_BACKOFF_JITTER', 0.01)
+    http_client.reset_session()
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), FlakyHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{httpd.server_address[1]}'
+    httpd.shutdown()
+    httpd.server_close()
+    http_client.reset_session()
+
+
+def test_http_get_retries(server):
+    FlakyHandler.statuses = [503, 429]
+    response = http_client.http_get(server + '/everything')
+    assert response.json() == {'status': 'ok'}
+    assert http_client.http_stats['retries'] == 2
+    assert http_client.http_stats['failures'] == 0
+
+
+def test_http_get_gives_up(server):
+    FlakyHandler.statuses = [500] * 5
+    response = http_client.http_get(server + '/everything')
+    assert response.status_code == 500
+    assert http_client.http_stats['retries'] == http_client.NEWS_MAX_RETRIES
+    assert http_client.http_stats['failures'] == 1
+
+
+def test_http_get_timeout(server, monkeypatch):
+    monkeypatch.setattr(http_client, 'NEWS_MAX_RETRIES', 0)
+    http_client.reset_session()
+    FlakyHandler.statuses = []
+    with pytest.raises(requests.exceptions.RequestException):
+        http_client.http_get(server + '/slow', timeout=(1, 0.2))
+    assert http_client.http_stats['failures'] == 1
@@ -0,0 +1,40 @@
+import json
+import pytest
+import load_config
+
+
+@pytest.fixture
+def config_path(tmp_path, monkeypatch):
+    path = tmp_path / 'config.json'
+    monkeypatch.setattr(load_config, 'CONFIG_PATH', str(path))
+    monkeypatch.setattr(load_config, 'CONFIG_CHECK_INTERVAL', 0)
+    monkeypatch.setattr(load_config, '_cache', {
+        'config': None, 'stamp': None, 'checked': 0.0, 'version': 0})
+    return path
+
+
+def test_get_config_creates_defaults(config_path):
+    config = load_config.get_config()
+    assert config.max_articles == 5
+    assert config.max_article_age is None
+    assert json.loads(config_path.read_text()) == load_config.DEFAULT_CONFIG
+    assert load_config.open_user_config()['covid_minor'] == 'Exeter'
+
+
+def test_get_config_reloads_on_change(config_path):
+    first = load_config.get_config()
+    assert load_config.get_config() is first
+    config_path.write_text(json.dumps(
+        dict(load_config.DEFAULT_CONFIG, max_articles='8', sort='newest')))
+    second = load_config.get_config()
+    assert second.max_articles == 8
+    assert second.version == first.version + 1
+    assert load_config.reload_config().version == second.version + 1
+
+
+def test_get_config_rejects_bad_values(config_path):
+    config_path.write_text(json.dumps(
+        dict(load_config.DEFAULT_CONFIG, max_articles='five')))
+    assert load_config.get_config().max_articles == 5
+    config_path.write_text('{"covid_minor": "Exeter"}')
+    assert load_config.reload_config().raw == load_config.DEFAULT_CONFIG
@@ -0,0 +1,17 @@
+import dashboard_functions
+import main
+import update_scheduler
+
+
+def test_start_app_runs_once(monkeypatch):
+    calls = []
+    monkeypatch.setattr(main, '_started', False)
+    monkeypatch.setattr(
+        update_scheduler, 'start_update_scheduler',
+        lambda: calls.append('scheduler'))
+    monkeypatch.setattr(
+        dashboard_functions, 'restore_updates',
+        lambda: calls.append('restore'))
+    main.start_app()
+    main.start_app()
+    assert calls == ['scheduler', 'restore']
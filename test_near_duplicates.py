@@ -0,0 +1,40 @@
+import threading
+from near_duplicates import NearDuplicateIndex
+
+
+def test_near_duplicate_index():
+    index = NearDuplicateIndex(threshold=0.7)
+    index.add('a', 'Covid cases rise sharply in Exeter as hospital admissions'
+                   ' climb for the third week running, figures show')
+    index.add('b', 'Government announces new vaccine booster programme for'
+                   ' over fifties starting next month across England')
+    assert index.find(
+        'Covid cases rise sharply in Exeter as hospital admissions climb'
+        ' for the third week running, new figures show') == 'a'
+    assert index.find(
+        'Schools reopen after half term with new testing guidance') is None
+    index.remove('a')
+    assert len(index) == 1
+    assert index.find(
+        'Covid cases rise sharply in Exeter as hospital admissions climb'
+        ' for the third week running, new figures show') is None
+
+
+def test_near_duplicate_index_threads():
+    index = NearDuplicateIndex(threshold=0.7)
+    titles = [f"Covid update number {number} for the region" for number in range(20)]
+
+    def churn():
+        for _ in range(20):
+            for title in titles:
+                index.add(title, title)
+                index.find(title)
+                index.remove(title)
+
+    threads = [threading.Thread(target=churn) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(index) == 0
+    assert not any(index._buckets)
@@ -1,5 +1,11 @@
+import data_version
+import news_data_handling
 from news_data_handling import news_API_request
 from news_data_handling import update_news
+from news_data_handling import remove_html_tags
+from news_data_handling import clean_articles
+from news_data_handling import remove_article
+from news_data_handling import news_API_request_all
 
 
 def test_news_API_request():
@@ -10,3 +16,87 @@ def test_news_API_request():
 def test_update_news():
     update_news('test')
 
+
+
+def test_remove_html_tags():
+    assert remove_html_tags(
+        '<p class="a>b">Hello <b>world</b></p>') == 'Hello world'
+    assert remove_html_tags("<a title='x'>1 > 0</a>") == '1  0'
+
+
+def test_clean_articles():
+    articles = [
+        {'content': '<li>Cases rise</li> in Exeter… [+1234 chars]'},
+        {'content': 'No postscript <b>here</b>'},
+    ]
+    assert clean_articles(articles) is articles
+    assert articles[0]['content'] == 'Cases rise in Exeter… '
+    assert articles[1]['content'] == 'No postscript <b>here</b>'
+
+
+def test_remove_article():
+    news_data_handling.news_articles.add({'title': 'Dismiss me'})
+    remove_article('Dismiss me')
+    assert 'Dismiss me' not in news_data_handling.news_articles
+    assert 'Dismiss me' in news_data_handling.blacklist
+
+
+def test_news_API_request_all(monkeypatch):
+    requested = []
+
+    def fake_request(covid_terms, page, domains, news_lang):
+        requested.append((covid_terms, page))
+        if covid_terms == 'broken':
+            return {'status': 'error', 'code': 'apiKeyInvalid'}
+        articles = [
+            {'title': f'{covid_terms} {page} {number}',
+             'url': f'https://news/{page}/{number}'}
+            for number in range(2)
+        ]
+        return {'status': 'ok', 'totalResults': 50, 'articles': articles}
+
+    monkeypatch.setattr(news_data_handling, 'news_API_request', fake_request)
+    query_sets = [
+        {'keywords': 'covid', 'domains': None, 'language': None},
+        {'keywords': 'vaccine', 'domains': 'bbc.co.uk', 'language': 'en'},
+        {'keywords': 'broken', 'domains': None, 'language': None},
+    ]
+    response = news_API_request_all(query_sets, max_pages=2)
+    assert sorted(requested) == [
+        ('broken', 1), ('covid', 1), ('covid', 2),
+        ('vaccine', 1), ('vaccine', 2)]
+    # The second query set's articles share URLs with the first's
+    assert [article['title'] for article in response['articles']] == [
+        'covid 1 0', 'covid 1 1', 'covid 2 0', 'covid 2 1']
+    assert news_API_request_all(query_sets[2:])['code'] == 'apiKeyInvalid'
+
+
+def test_update_news_only_bumps_on_change(monkeypatch):
+    response = {'status': 'ok', 'articles': [{
+        'title': 'Unchanged story', 'content': 'Same text every run',
+        'url': 'https://example.com/unchanged'}]}
+    monkeypatch.setattr(
+        news_data_handling, 'news_API_request_all', lambda *args: response)
+    update_news('first')
+    assert 'Unchanged story' in news_data_handling.news_articles
+    version = data_version.current()
+    update_news('second')
+    assert data_version.current() == version
+    news_data_handling.discard_article('Unchanged story')
+
+
+def test_update_news_skips_held_articles_before_minhash(monkeypatch):
+    response = {'status': 'ok', 'articles': [{
+        'title': 'Held story', 'content': 'Fetched again every refresh',
+        'url': 'https://example.com/held'}]}
+    monkeypatch.setattr(
+        news_data_handling, 'news_API_request_all', lambda *args: response)
+    update_news('first')
+    looked_up = []
+    find = news_data_handling.near_duplicates.find
+    monkeypatch.setattr(
+        news_data_handling.near_duplicates, 'find',
+        lambda text: looked_up.append(text) or find(text))
+    update_news('second')
+    assert looked_up == []
+    news_data_handling.discard_article('Held story')
@@ -0,0 +1,19 @@
+import datetime
+from news_query import NewsQueryBuilder
+
+
+def test_news_query_builder():
+    config = {
+        'news_api_url_stub': 'https://newsapi.org/v2/everything?',
+        'domains': '', 'sort': '', 'max_article_age': '2',
+        'news_lang': 'en', 'news_API_key': 'k&y',
+    }
+    builder = NewsQueryBuilder()
+    url = builder.url(config, 'Covid COVID-19', page=2)
+    date = (datetime.date.today() - datetime.timedelta(days=2)).isoformat()
+    assert url == (
+        'https://newsapi.org/v2/everything?qInTitle=Covid%20OR%20COVID-19'
+        '&sortBy=relevancy&language=en&pageSize=20&apiKey=k%26y'
+        f'&from={date}&page=2')
+    config['domains'] = 'bbc.co.uk'
+    assert '&domains=bbc.co.uk&' in builder.url(config, 'Covid COVID-19')
@@ -0,0 +1,44 @@
+import datetime
+import zoneinfo
+import pytest
+from recurrence import parse_recurrence
+
+
+def test_recurrence_across_daylight_saving():
+    london = zoneinfo.ZoneInfo('Europe/London')
+
+    def at(*args):
+        return datetime.datetime(*args, tzinfo=london).timestamp()
+
+    daily = parse_recurrence('09:00', london)
+    # Clocks go forward overnight, so the day is only 23 hours long
+    assert daily.next_fire(at(2021, 3, 27, 9, 0)) - \
+        at(2021, 3, 27, 9, 0) == 23 * 60 * 60
+    half_hourly = parse_recurrence('*/30 * * * *', london)
+    fires = [at(2021, 10, 31, 0, 45)]
+    for _ in range(4):
+        fires.append(half_hourly.next_fire(fires[-1]))
+    # 01:00 and 01:30 happen twice when the clocks go back but fire once
+    assert [
+        datetime.datetime.fromtimestamp(fire, london).strftime('%H:%M')
+        for fire in fires[1:]
+    ] == ['01:00', '01:30', '02:00', '02:30']
+    assert fires[3] - fires[2] == 90 * 60
+    # 01:30 is skipped when the clocks go forward, so it fires at the
+    # change instead, and skipped times still fire before later ones
+    skipped = parse_recurrence('01:30', london)
+    assert skipped.next_fire(at(2021, 3, 28, 0, 0)) == at(2021, 3, 28, 2, 0)
+    assert skipped.next_fire(at(2021, 3, 28, 2, 0)) == at(2021, 3, 29, 1, 30)
+    both = parse_recurrence('15,30 1,2 * * *', london)
+    fire = both.next_fire(at(2021, 3, 28, 0, 0))
+    assert [fire, both.next_fire(fire)] == [
+        at(2021, 3, 28, 2, 0), at(2021, 3, 28, 2, 15)]
+
+
+def test_recurrence_parsing():
+    weekdays = parse_recurrence('0 12 * * mon-fri')
+    assert weekdays.weekdays == frozenset(range(1, 6))
+    assert parse_recurrence('every 2h').next_fire(100) == 7300
+    for spec in ('25:00', '* * *', '*/0 * * * *', 'every soon'):
+        with pytest.raises(ValueError):
+            parse_recurrence(spec)
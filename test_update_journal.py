@@ -0,0 +1,25 @@
+from update_journal import UpdateJournal
+
+
+def test_update_journal_replay_and_compaction(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    journal = UpdateJournal(path)
+    journal.schedule({'title': 'once', 'time': '10:00', 'type': 'news',
+                      'repeat': 0, 'event': object()})
+    journal.schedule({'title': 'daily', 'time': '11:00',
+                      'type': 'covid_data', 'repeat': 1})
+    journal.schedule({'title': 'gone', 'time': '12:00', 'type': 'news',
+                      'repeat': 1})
+    journal.fire('once')
+    journal.fire('daily')
+    journal.cancel('gone')
+    journal.close()
+    with open(path, 'a', encoding='utf-8') as file:
+        file.write('{"op": "cancel", "title": "dai')
+    restarted = UpdateJournal(path)
+    assert [item['title'] for item in restarted.replay()] == ['daily']
+    restarted.compact()
+    with open(path, encoding='utf-8') as file:
+        assert len(file.readlines()) == 1
+    restarted.cancel('daily')
+    assert UpdateJournal(path).replay() == []
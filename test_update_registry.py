@@ -0,0 +1,20 @@
+from update_registry import UpdateRegistry
+
+
+def test_update_registry():
+    registry = UpdateRegistry()
+    registry.add({'title': 'a', 'event': 'e1', 'repeat': 0})
+    registry.add({'title': 'b', 'event': 'e2', 'repeat': 1})
+    assert registry.unique_title('a') == 'a (2)'
+    registry.complete(registry.get('b'), lambda update: 'e3')
+    assert registry.get('b')['event'] == 'e3'
+    stale = registry.get('a')
+    assert registry.complete(stale, lambda update: 'unused')
+    assert 'a' not in registry
+    # A run finishing after its toast was replaced leaves the new one be
+    registry.add({'title': 'a', 'event': 'e4', 'repeat': 0})
+    assert not registry.complete(stale, lambda update: 'unused')
+    assert registry.get('a')['event'] == 'e4'
+    registry.remove('a')
+    assert [item['title'] for item in registry] == ['b']
+    assert registry.remove('b')['event'] == 'e3' and not registry
@@ -0,0 +1,18 @@
+import sched
+import threading
+import time
+import covid_data_handler
+import update_scheduler
+
+
+def test_update_scheduler_runs_due_events(monkeypatch):
+    # A scheduler of its own, so events other tests left queued don't run
+    monkeypatch.setattr(
+        covid_data_handler, 's', sched.scheduler(time.time, time.sleep))
+    fired = threading.Event()
+    covid_data_handler.s.enter(0, 1, fired.set)
+    update_scheduler.start_update_scheduler()
+    try:
+        assert fired.wait(5)
+    finally:
+        update_scheduler.stop_update_scheduler(5)
@@ -0,0 +1,43 @@
+from __future__ import annotations
+import logging
+import sched
+
+# Scheduled updates of the same kind that are due in the same wall clock
+# minute run as one job, so every update for the same HH:MM shares one
+# fetch
+COALESCE_SECONDS = 60
+
+
+def take_due_events(
+        scheduler: sched.scheduler, action, due: float) -> list[tuple]:
+    """ Takes every queued event for 'action' that is due in the same
+        minute as 'due' off the scheduler, so it can be run as part of
+        the job that was due then. Events due in the next minute are
+        left alone, even if they are only seconds away.
+
+    :param scheduler: Scheduler to look through
+    :type scheduler: sched.scheduler
+    :param action: Event action to look for
+    :type action: callable
+    :param due: Time the running job was scheduled for
+    :type due: float
+    :return: Returns the arguments of the events that were taken
+    :rtype: list[tuple]
+    """
+    minute = due // COALESCE_SECONDS
+    taken = []
+    for event in scheduler.queue:
+        if event.time // COALESCE_SECONDS > minute:
+            break
+        if event.action is not action or \
+                event.time // COALESCE_SECONDS != minute:
+            continue
+        try:
+            scheduler.cancel(event)
+        except ValueError:
+            # Already run or cancelled by someone else
+            continue
+        taken.append(event.argument)
+    if taken:
+        logging.debug("Coalesced %s scheduled events", len(taken))
+    return taken
@@ -0,0 +1,151 @@
+from __future__ import annotations
+import collections
+import json
+import logging
+import os
+import threading
+
+UPDATE_JOURNAL_PATH = 'updates_journal.jsonl'
+# The journal is compacted once it holds this many more records than
+# there are scheduled updates
+JOURNAL_COMPACT_SLACK = 100
+
+# Fields of an update toast that are written to the journal
+_FIELDS = ('title', 'content', 'time', 'recurrence', 'type', 'repeat')
+
+
+class UpdateJournal:
+    """ Append-only log of scheduled updates, one JSON record per line,
+        so scheduled updates survive a restart. Three kinds of record
+        are written: 'schedule' when an update is set, 'cancel' when it
+        is removed from the dashboard and 'fire' when it runs. Replaying
+        the records gives back the updates that are still scheduled.
+
+        Every record is flushed and synced to disk before the call
+        returns. A crash part way through a write leaves at most a
+        broken last line, which is dropped when the journal is read.
+        Compaction writes the scheduled updates to a new file and moves
+        it over the old one, so the journal is never half rewritten.
+    """
+
+    def __init__(self, path: str = UPDATE_JOURNAL_PATH) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+        self._records = 0
+        self._active = None
+
+    def replay(self) -> list[dict]:
+        """ Reads the journal and returns the updates that are still
+            scheduled, in the order they were first set.
+
+        :return: Returns the scheduled updates
+        :rtype: list[dict]
+        """
+        with self._lock:
+            self._read()
+            return [dict(update) for update in self._active.values()]
+
+    def _read(self) -> None:
+        """ Loads the scheduled updates from the journal file. Must be
+            called holding _lock.
+        """
+        self._active = collections.OrderedDict()
+        self._records = 0
+        offset = 0
+        try:
+            with open(self.path, 'rb') as file:
+                for number, line in enumerate(file, 1):
+                    if not line.endswith(b'\n'):
+                        # Cut off a record left half written by a crash,
+                        # so the next record starts on a line of its own
+                        logging.warning(
+                            "Dropping incomplete last line of %s", self.path)
+                        os.truncate(self.path, offset)
+                        break
+                    offset += len(line)
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        logging.warning(
+                            "Skipping unreadable line %s of %s",
+                            number, self.path)
+                        continue
+                    self._apply(record)
+                    self._records += 1
+        except FileNotFoundError:
+            pass
+
+    def _apply(self, record: dict) -> None:
+        """ Updates the scheduled updates with one journal record """
+        title = record.get('title')
+        if record.get('op') == 'schedule':
+            self._active.pop(title, None)
+            self._active[title] = {
+                field: record.get(field) for field in _FIELDS}
+        elif record.get('op') == 'cancel':
+            self._active.pop(title, None)
+        elif record.get('op') == 'fire':
+            update = self._active.get(title)
+            if update is not None and not update.get('repeat'):
+                del self._active[title]
+
+    def schedule(self, update: dict) -> None:
+        """ Records that an update has been scheduled """
+        record = {field: update.get(field) for field in _FIELDS}
+        record['op'] = 'schedule'
+        self._append(record)
+
+    def cancel(self, title: str) -> None:
+        """ Records that an update has been cancelled """
+        self._append({'op': 'cancel', 'title': title})
+
+    def fire(self, title: str) -> None:
+        """ Records that an update has run. Updates that don't repeat
+            are no longer scheduled after this.
+        """
+        self._append({'op': 'fire', 'title': title})
+
+    def _append(self, record: dict) -> None:
+        with self._lock:
+            if self._active is None:
+                self._read()
+            self._apply(record)
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(json.dumps(record) + '\n')
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._records += 1
+            if self._records > len(self._active) + JOURNAL_COMPACT_SLACK:
+                self._compact()
+
+    def compact(self) -> None:
+        """ Rewrites the journal so it only holds the scheduled updates """
+        with self._lock:
+            if self._active is None:
+                self._read()
+            self._compact()
+
+    def _compact(self) -> None:
+        """ Must be called holding _lock """
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            for update in self._active.values():
+                file.write(json.dumps(dict(update, op='schedule')) + '\n')
+            file.flush()
+            os.fsync(file.fileno())
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        os.replace(temp_path, self.path)
+        self._records = len(self._active)
+        logging.debug(
+            "Compacted %s to %s records", self.path, self._records)
+
+    def close(self) -> None:
+        """ Closes the journal file. It is opened again if needed. """
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
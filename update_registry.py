@@ -0,0 +1,107 @@
+from __future__ import annotations
+import collections
+import logging
+import threading
+import data_version
+
+
+class UpdateRegistry:
+    """ Scheduled update toasts, indexed by title. Toasts keep the order
+        they were added in for display. Finished events are reported
+        with 'complete' by the scheduler itself, so nothing has to poll
+        the scheduler queues. Every change bumps the dashboard data
+        version.
+    """
+
+    def __init__(self) -> None:
+        self._by_title = collections.OrderedDict()
+        # Updates finish on the scheduler thread while requests read and
+        # change the registry
+        self._lock = threading.RLock()
+
+    def unique_title(self, title: str) -> str:
+        """ Returns 'title', or 'title (2)', 'title (3)' and so on if an
+            update with that title already exists.
+        """
+        with self._lock:
+            unique = title
+            number = 1
+            while unique in self._by_title:
+                number += 1
+                unique = f"{title} ({number})"
+            return unique
+
+    def add(self, update: dict) -> None:
+        """ Adds an update, replacing any with the same title """
+        with self._lock:
+            self._by_title.pop(update['title'], None)
+            self._by_title[update['title']] = update
+        data_version.bump("updates")
+
+    def set_event(self, title: str, event: object) -> None:
+        """ Points an update at a new scheduler event, e.g. after a
+            repeating update has been scheduled again.
+        """
+        with self._lock:
+            update = self._by_title.get(title)
+            if update is not None:
+                update['event'] = event
+
+    def get(self, title: str) -> dict | None:
+        """ Returns the update with the given title, or None """
+        return self._by_title.get(title)
+
+    def remove(self, title: str) -> dict | None:
+        """ Removes the update with the given title.
+
+        :param title: Title of the update to remove
+        :type title: str
+        :return: Returns the removed update, or None if there wasn't one
+        :rtype: dict or None
+        """
+        with self._lock:
+            update = self._by_title.pop(title, None)
+        if update is not None:
+            data_version.bump("updates")
+        return update
+
+    def complete(self, update: dict, reschedule) -> bool:
+        """ Called when an update's event has run. Repeating updates are
+            handed to 'reschedule', which returns their next event, and
+            other updates are removed. An update that is no longer in
+            the registry is left alone, so a run that finishes after its
+            toast was dismissed can't touch a new update with the same
+            title.
+
+        :param update: The update whose event ran
+        :type update: dict
+        :param reschedule: Function taking the update and returning its
+            next scheduler event
+        :type reschedule: callable
+        :return: Returns whether the update was still registered
+        :rtype: bool
+        """
+        title = update['title']
+        with self._lock:
+            if self._by_title.get(title) is not update:
+                logging.debug("Ignoring finished stale update: %s", title)
+                return False
+            if update.get('repeat'):
+                logging.debug("Rescheduling update: %s", title)
+                self.set_event(title, reschedule(update))
+                return True
+            logging.debug("Removing finished update: %s", title)
+            del self._by_title[title]
+        data_version.bump("updates")
+        return True
+
+    def __contains__(self, title: str) -> bool:
+        return title in self._by_title
+
+    def __iter__(self):
+        # Iterate over a copy so updates can finish while rendering
+        with self._lock:
+            return iter(list(self._by_title.values()))
+
+    def __len__(self) -> int:
+        return len(self._by_title)
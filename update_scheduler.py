@@ -0,0 +1,97 @@
+from __future__ import annotations
+import logging
+import threading
+import covid_data_handler
+import news_data_handling
+
+# Longest time the scheduler thread will sleep before rechecking the
+# queues. Keeps newly scheduled events responsive even if nobody calls
+# 'wake_update_scheduler'.
+MAX_IDLE_SECONDS = 1.0
+
+_wake = threading.Event()
+_stop = threading.Event()
+_thread = None
+
+
+def _next_delay() -> float:
+    """ Works out how long the scheduler thread can sleep for
+        before the next covid or news event is due.
+
+    :return: Seconds until the earliest queued event, capped at
+        MAX_IDLE_SECONDS.
+    :rtype: float
+    """
+    delays = [MAX_IDLE_SECONDS]
+    for scheduler in (covid_data_handler.s, news_data_handling.s):
+        delay = scheduler.run(blocking=False)
+        if delay is not None:
+            delays.append(delay)
+    return max(min(delays), 0)
+
+
+def _run_scheduler_loop() -> None:
+    """ Body of the background scheduler thread. Fires any due
+        covid and news events, then sleeps until the next one is due
+        or until it is woken up by a newly scheduled event.
+
+    :return: Doesn't return anything
+    :rtype: None
+    """
+    logging.info("Background update scheduler started.")
+    while not _stop.is_set():
+        try:
+            delay = _next_delay()
+        except Exception:  # pylint: disable=broad-except
+            # A failing update must never take the scheduler down
+            logging.error(
+                "Scheduled update raised an exception.", exc_info=True)
+            delay = MAX_IDLE_SECONDS
+        _wake.wait(delay)
+        _wake.clear()
+    logging.info("Background update scheduler stopped.")
+
+
+def start_update_scheduler() -> threading.Thread:
+    """ Starts the background thread that runs the covid and news
+        schedulers, so that updates fire on time whether or not
+        anyone is viewing the dashboard. Calling it again while the
+        thread is alive does nothing.
+
+    :return: Returns the scheduler thread
+    :rtype: threading.Thread
+    """
+    global _thread
+    if _thread is not None and _thread.is_alive():
+        return _thread
+    _stop.clear()
+    _thread = threading.Thread(
+        target=_run_scheduler_loop, name="update-scheduler", daemon=True)
+    _thread.start()
+    return _thread
+
+
+def wake_update_scheduler() -> None:
+    """ Wakes the scheduler thread so it picks up a newly
+        scheduled or cancelled event straight away.
+
+    :return: Doesn't return anything
+    :rtype: None
+    """
+    _wake.set()
+
+
+def stop_update_scheduler(timeout: float = None) -> None:
+    """ Stops the background scheduler thread.
+
+    :param timeout: Seconds to wait for the thread to finish
+    :type timeout: float
+    :return: Doesn't return anything
+    :rtype: None
+    """
+    global _thread
+    _stop.set()
+    _wake.set()
+    if _thread is not None:
+        _thread.join(timeout)
+        _thread = None